@@ -1,22 +1,42 @@
+# Only NumPy and the standard library are imported up front so that importing
+# PEP (and loading an exported model) stays fast. pandas, joblib and the
+# scikit-learn estimators are imported inside the functions that need them.
 import numpy as np
-import pandas as pd
-# data visualization (kept as optional imports)
-import matplotlib.pyplot as plt
-import seaborn as sns
-# machine learning
-from sklearn.model_selection import train_test_split
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.metrics import accuracy_score
+import copy
+import hashlib
+import json
 import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from importlib import metadata
+from typing import Optional
+from types import MappingProxyType
 
-# Module-level model placeholders (built lazily)
-_MODEL_TREE = None
-_MODEL_FOREST = None
-_MODEL_GNB = None
-_SYMPTOMS = None
-_DISEASE = None
+# Trained models are persisted as versioned artifacts so fresh processes can
+# skip training. Bump _ARTIFACT_FORMAT whenever the artifact layout changes.
+_ARTIFACT_FORMAT = 4
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.environ.get('PEP_MODEL_DIR', os.path.join(_BASE_DIR, 'models'))
+# Compact binary copy of the CSVs written by ``convert_dataset``
+DATA_DIR = os.environ.get('PEP_DATA_DIR', os.path.join(_BASE_DIR, 'data'))
+_DATASET_FORMAT = 1
+
+# Inference backend: 'sklearn' calls the fitted estimators, 'compiled' evaluates
+# flat NumPy copies of them (see CompiledForest / CompiledGNB)
+ENGINES = ('sklearn', 'compiled')
+DEFAULT_ENGINE = os.environ.get('PEP_ENGINE', 'sklearn')
+# answer inputs identical to a training profile from the ExactMatchIndex
+# instead of running a model; PEP_EXACT_MATCH=0 turns it off by default
+EXACT_MATCH = os.environ.get('PEP_EXACT_MATCH', '1') != '0'
+# serve this artifact version instead of the one for the default TrainConfig,
+# e.g. one exported with `python PEP.py train --n-estimators 10` or `compact`
+MODEL_VERSION = os.environ.get('PEP_MODEL_VERSION') or None
 
 symptoms = ['itching', 'skin_rash', 'nodal_skin_eruptions','continuous_sneezing', 'shivering',
 'chills','joint_pain','stomach_pain','acidity','ulcers_on_tongue','muscle_wasting','vomiting','burning_micturition','spotting_urination','fatigue','weight_gain','anxiety','cold_hands_and_feets','mood_swings','weight_loss','restlessness','lethargy','patches_in_throat','irregular_sugar_level','cough','high_fever','sunken_eyes','breathlessness','sweating','dehydration','indigestion','headache','yellowish_skin','dark_urine','nausea','loss_of_appetite','pain_behind_the_eyes','back_pain'
@@ -28,128 +48,2576 @@ disease = ['Fungalinfection','Allergy','GERD','Chroniccholestasis','DrugReaction
          '(vertigo)Paroymsal Positional Vertigo','Acne','Urinary tract infection','Psoriasis','Impetigo']
 
 
+_NON_ALNUM = re.compile(r'[^a-z0-9]')
+
+
 def _norm_label(s):
-    import re
-    return re.sub(r'[^a-z0-9]', '', str(s).lower())
+    return _NON_ALNUM.sub('', str(s).lower())
 
 
-def build_models(verbose=False):
-    """Build and return (tree, forest, gnb, symptoms, disease).
+@lru_cache(maxsize=None)
+def _sklearn_version():
+    # read from package metadata: ``import sklearn`` alone costs ~1s
+    return metadata.version('scikit-learn')
+
+
+def _data_paths():
+    """Return (training.csv, Testing.csv) paths relative to this file."""
+    return (os.path.join(_BASE_DIR, 'training.csv'),
+            os.path.join(_BASE_DIR, 'Testing.csv'))
+
 
-    This function caches models in module-level variables so repeated calls are cheap.
+@dataclass(frozen=True)
+class TrainConfig:
+    """Training options for ``train_models``/``build_models``.
+
+    ``n_estimators``, ``random_state`` and ``dedupe`` change the fitted models
+    and are part of the artifact version; with a fixed ``random_state``
+    repeated builds give identical models. ``dedupe`` fits on each distinct
+    (symptoms, disease) row once, weighted by how often it occurs, which is
+    much faster on the repetitive training.csv. ``n_jobs`` is the RandomForest
+    fit parallelism, ``max_workers``/``executor`` control the pool that fits
+    the three models concurrently ('thread' or 'process'). These only affect
+    speed.
     """
-    global _MODEL_TREE, _MODEL_FOREST, _MODEL_GNB, _SYMPTOMS, _DISEASE
-    if _MODEL_TREE is not None:
-        return _MODEL_TREE, _MODEL_FOREST, _MODEL_GNB, _SYMPTOMS, _DISEASE
+    n_estimators: int = 100
+    random_state: Optional[int] = 42
+    n_jobs: Optional[int] = None
+    max_workers: int = 3
+    executor: str = 'thread'
+    dedupe: bool = True
+
+    def version_key(self):
+        """Return the options that affect the fitted models, as a string."""
+        return (f'n_estimators={self.n_estimators};random_state={self.random_state};'
+                f'dedupe={self.dedupe}')
+
+
+DEFAULT_TRAIN_CONFIG = TrainConfig()
+
+
+def model_version(config=None):
+    """Return the artifact version for the current data and environment.
+
+    The version is a content hash of the training/testing CSVs combined with
+    the installed scikit-learn version, the artifact format and the training
+    options that affect the models, so any change invalidates previously
+    exported models.
+    """
+    config = config or DEFAULT_TRAIN_CONFIG
+    h = hashlib.sha256()
+    h.update(f'format={_ARTIFACT_FORMAT};sklearn={_sklearn_version()};'.encode())
+    h.update(f'{config.version_key()};'.encode())
+    h.update(_source_digest().encode())
+    return h.hexdigest()[:16]
+
+
+def _csv_digest():
+    """Return the sha256 of training.csv followed by Testing.csv.
+
+    The hash is cached until either file's size or modification time changes.
+    """
+    stats = [os.stat(path) for path in _data_paths()]
+    return _hash_files(tuple((path, st.st_size, st.st_mtime_ns)
+                             for path, st in zip(_data_paths(), stats)))
+
+
+@lru_cache(maxsize=8)
+def _hash_files(signature):
+    # signature is ((path, size, mtime_ns), ...); only the paths are read
+    h = hashlib.sha256()
+    for path, _, _ in signature:
+        with open(path, 'rb') as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _source_digest():
+    # The CSVs are the source of truth; a deployment that ships only the
+    # compact dataset falls back to the digest recorded when it was converted.
+    if all(os.path.exists(p) for p in _data_paths()):
+        return _csv_digest()
+    meta = _compact_meta()
+    if meta is None:
+        raise FileNotFoundError('training.csv/Testing.csv not found and no compact dataset in '
+                                f'{DATA_DIR}')
+    return meta['source_sha256']
+
+
+def default_version():
+    """Return the version served by default: ``MODEL_VERSION`` or ``model_version()``."""
+    return MODEL_VERSION or model_version()
+
+
+def artifact_path(version=None):
+    """Return the artifact file path for ``version`` (default: ``default_version()``)."""
+    return os.path.join(MODEL_DIR, f'pep-{version or default_version()}.joblib')
+
+
+def _clean_column(name):
+    """Normalise a CSV header, e.g. 'spotting_ urination' -> 'spotting_urination'."""
+    return str(name).replace(' ', '')
+
+
+def load_training_data(source='auto'):
+    """Return a dict of encoded train/test arrays.
+
+    Keys: ``X_train``, ``y_train``, ``X_test``, ``y_test`` (uint8 features in
+    ``symptoms`` column order, integer class labels), ``symptoms``,
+    ``disease`` and ``label_mapping`` (CSV prognosis -> class index).
+
+    ``source='auto'`` memory-maps the compact dataset from ``DATA_DIR`` when it
+    exists and was converted from the current CSVs, and parses the CSVs
+    otherwise; ``'csv'`` and ``'compact'`` force one or the other.
+    """
+    if source not in ('auto', 'csv', 'compact'):
+        raise ValueError(f"source must be 'auto', 'csv' or 'compact', got {source!r}")
+    if source != 'csv':
+        meta = _compact_meta()
+        current = meta is not None and (
+            source == 'compact' or meta['source_sha256'] == _source_digest())
+        if current:
+            return _load_compact_data(meta)
+        if source == 'compact':
+            raise FileNotFoundError(f'no compact dataset in {DATA_DIR}; run `python PEP.py convert`')
+    return _load_csv_data()
+
+
+def _label_mapping(labels, disease_list):
+    """Map raw prognosis labels to indices into ``disease_list``.
+
+    Labels match a disease when their lower-cased alphanumerics are equal,
+    else when one contains the other; unmatched labels are appended to
+    ``disease_list`` as new classes.
+    """
+    normalized = [_norm_label(d) for d in disease_list]
+    mapping = {}
+    for lab in labels:
+        nlab = _norm_label(lab)
+        found = next((i for i, d in enumerate(normalized) if d == nlab), None)
+        if found is None:
+            found = next((i for i, d in enumerate(normalized) if d in nlab or nlab in d), None)
+        if found is None:
+            found = len(disease_list)
+            disease_list.append(lab)
+            normalized.append(nlab)
+        mapping[lab] = found
+    return mapping
+
+
+def _load_csv_data():
+    import pandas as pd
 
     # Read CSVs using paths relative to this file for cross-platform compatibility
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    train_path = os.path.join(base_dir, 'training.csv')
-    test_path = os.path.join(base_dir, 'Testing.csv')
+    train_path, test_path = _data_paths()
     train = pd.read_csv(train_path)
     test = pd.read_csv(test_path)
     # normalize column names: remove stray spaces so they match symptom keys
-    train.columns = train.columns.str.replace(' ', '', regex=False)
-    test.columns = test.columns.str.replace(' ', '', regex=False)
+    train.columns = [_clean_column(c) for c in train.columns]
+    test.columns = [_clean_column(c) for c in test.columns]
 
     # symptoms list (reuse original variable content)
-    _SYMPTOMS = [
+    symptom_list = [
         'itching','skin_rash','nodal_skin_eruptions','continuous_sneezing','shivering','chills','joint_pain','stomach_pain','acidity','ulcers_on_tongue','muscle_wasting','vomiting','burning_micturition','spotting_urination','fatigue','weight_gain','anxiety','cold_hands_and_feets','mood_swings','weight_loss','restlessness','lethargy','patches_in_throat','irregular_sugar_level','cough','high_fever','sunken_eyes','breathlessness','sweating','dehydration','indigestion','headache','yellowish_skin','dark_urine','nausea','loss_of_appetite','pain_behind_the_eyes','back_pain','constipation','abdominal_pain','diarrhoea','mild_fever','yellow_urine','yellowing_of_eyes','acute_liver_failure','fluid_overload','swelling_of_stomach','swelled_lymph_nodes','malaise','blurred_and_distorted_vision','phlegm','throat_irritation','redness_of_eyes','sinus_pressure','runny_nose','congestion','chest_pain','weakness_in_limbs','fast_heart_rate','pain_during_bowel_movements','pain_in_anal_region','bloody_stool','irritation_in_anus','neck_pain','dizziness','cramps','bruising','obesity','swollen_legs','swollen_blood_vessels','puffy_face_and_eyes','enlarged_thyroid','brittle_nails','swollen_extremeties','excessive_hunger','extra_marital_contacts','drying_and_tingling_lips','slurred_speech','knee_pain','hip_joint_pain','muscle_weakness','stiff_neck','swelling_joints','movement_stiffness','spinning_movements','loss_of_balance','unsteadiness','weakness_of_one_body_side','loss_of_smell','bladder_discomfort','foul_smell_ofurine','continuous_feel_of_urine','passage_of_gases','internal_itching','toxic_look_(typhos)','depression','irritability','muscle_pain','altered_sensorium','red_spots_over_body','belly_pain','abnormal_menstruation','dischromic_patches','watering_from_eyes','increased_appetite','polyuria','family_history','mucoid_sputum','rusty_sputum','lack_of_concentration','visual_disturbances','receiving_blood_transfusion','receiving_unsterile_injections','coma','stomach_bleeding','distention_of_abdomen','history_of_alcohol_consumption','fluid_overload.1','blood_in_sputum','prominent_veins_on_calf','palpitations','painful_walking','pus_filled_pimples','blackheads','scurring','skin_peeling','silver_like_dusting','small_dents_in_nails','inflammatory_nails','blister','red_sore_around_nose','yellow_crust_ooze'
     ]
 
-    _DISEASE = list(disease)
+    disease_list = list(disease)
 
     # Build robust mapping for prognosis labels to integer classes.
     all_labels = pd.concat([train['prognosis'], test['prognosis']], ignore_index=True).unique()
-    mapping = {}
-    for lab in all_labels:
-        nlab = _norm_label(lab)
-        found = None
-        for i, d in enumerate(_DISEASE):
-            if _norm_label(d) == nlab:
-                found = i
-                break
-        if found is None:
-            for i, d in enumerate(_DISEASE):
-                if _norm_label(d) in nlab or nlab in _norm_label(d):
-                    found = i
-                    break
-        if found is None:
-            found = len(_DISEASE)
-            _DISEASE.append(lab)
-        mapping[lab] = found
+    mapping = _label_mapping(all_labels, disease_list)
 
     train['prognosis'] = train['prognosis'].map(mapping)
     test['prognosis'] = test['prognosis'].map(mapping)
 
-    X_train = train[_SYMPTOMS]
+    # Fit on plain arrays so prediction can pass NumPy matrices straight through
+    X_train = train[symptom_list].to_numpy(dtype=np.uint8)
     y_train = np.ravel(train[['prognosis']])
-    X_test = test[_SYMPTOMS]
+    X_test = test[symptom_list].to_numpy(dtype=np.uint8)
     y_test = np.ravel(test[['prognosis']])
 
+    return {
+        'X_train': X_train,
+        'y_train': y_train,
+        'X_test': X_test,
+        'y_test': y_test,
+        'symptoms': symptom_list,
+        'disease': disease_list,
+        'label_mapping': {str(k): int(v) for k, v in mapping.items()},
+    }
+
+
+def _compact_meta(data_dir=None):
+    path = os.path.join(data_dir or DATA_DIR, 'dataset.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        meta = json.load(fh)
+    if meta.get('format') != _DATASET_FORMAT:
+        return None
+    meta['dir'] = data_dir or DATA_DIR
+    return meta
+
+
+def _load_compact_data(meta):
+    data = {}
+    for split in ('train', 'test'):
+        X = np.load(os.path.join(meta['dir'], f'{split}_X.npy'), mmap_mode='r')
+        if meta['packed']:
+            X = np.unpackbits(X, axis=1, count=len(meta['symptoms']))
+        y = np.load(os.path.join(meta['dir'], f'{split}_y.npy'), mmap_mode='r')
+        data[f'X_{split}'] = X
+        # int16 on disk; widen so fitted models match the CSV-trained ones
+        data[f'y_{split}'] = y.astype(np.int64)
+    data['symptoms'] = list(meta['symptoms'])
+    data['disease'] = list(meta['disease'])
+    data['label_mapping'] = dict(meta['label_mapping'])
+    return data
+
+
+def convert_dataset(out_dir=None, packed=False):
+    """Write the CSVs as a compact binary dataset and return its directory.
+
+    Features are stored as a uint8 0/1 matrix (or bit-packed along the symptom
+    axis with ``packed=True``) and labels as int16 class codes, one ``.npy``
+    file each per split, loadable with ``np.load(mmap_mode='r')``.
+    ``dataset.json`` holds the symptom/disease vocabularies, the label mapping
+    and the sha256 of the source CSVs.
+    """
+    out_dir = out_dir or DATA_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    data = _load_csv_data()
+    for split in ('train', 'test'):
+        X = data[f'X_{split}']
+        if packed:
+            X = np.packbits(X, axis=1)
+        np.save(os.path.join(out_dir, f'{split}_X.npy'), np.ascontiguousarray(X))
+        np.save(os.path.join(out_dir, f'{split}_y.npy'), data[f'y_{split}'].astype(np.int16))
+    meta = {
+        'format': _DATASET_FORMAT,
+        'source_sha256': _csv_digest(),
+        'packed': bool(packed),
+        'n_train': int(len(data['y_train'])),
+        'n_test': int(len(data['y_test'])),
+        'symptoms': data['symptoms'],
+        'disease': data['disease'],
+        'label_mapping': data['label_mapping'],
+    }
+    # written last: its presence marks the dataset as complete
+    tmp_path = os.path.join(out_dir, f'dataset.json.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as fh:
+        json.dump(meta, fh, indent=1)
+    os.replace(tmp_path, os.path.join(out_dir, 'dataset.json'))
+    return out_dir
+
+
+def _timed_fit(model, X, y, sample_weight=None):
+    start = time.perf_counter()
+    model.fit(X, y, sample_weight=sample_weight)
+    return model, time.perf_counter() - start
+
+
+def _fit_rows(X, y, dedupe=True):
+    """Return ``(X, y, sample_weight)`` to fit; ``dedupe`` keeps distinct rows weighted by count."""
+    if not dedupe:
+        return X, y, None
+    X, y = np.asarray(X), np.asarray(y)
+    rows, counts = np.unique(np.column_stack([X, y]), axis=0, return_counts=True)
+    return rows[:, :-1].astype(X.dtype), rows[:, -1].astype(y.dtype), counts.astype(np.float64)
+
+
+def train_models(verbose=False, config=None):
+    """Fit the classifiers from the CSVs and return an artifact payload dict.
+
+    The three models are fitted concurrently in a pool (see ``TrainConfig``)
+    and their wall-clock fit times are recorded under ``fit_times``.
+    This always trains; use ``build_models`` to reuse a saved artifact.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.tree import DecisionTreeClassifier
+
+    start = time.perf_counter()
+    config = config or DEFAULT_TRAIN_CONFIG
+    if config.executor not in ('thread', 'process'):
+        raise ValueError(f"executor must be 'thread' or 'process', got {config.executor!r}")
+    data = load_training_data()
+    X_train, y_train = data['X_train'], data['y_train']
+    X_test, y_test = data['X_test'], data['y_test']
+
     # Train models
-    _MODEL_TREE = DecisionTreeClassifier().fit(X_train, y_train)
-    _MODEL_FOREST = RandomForestClassifier().fit(X_train, y_train)
-    _MODEL_GNB = GaussianNB().fit(X_train, y_train)
+    models = {
+        'tree': DecisionTreeClassifier(random_state=config.random_state),
+        'random': RandomForestClassifier(n_estimators=config.n_estimators,
+                                         random_state=config.random_state,
+                                         n_jobs=config.n_jobs),
+        'gnb': GaussianNB(),
+    }
+    X_fit, y_fit, sample_weight = _fit_rows(X_train, y_train, config.dedupe)
+    pool_cls = ProcessPoolExecutor if config.executor == 'process' else ThreadPoolExecutor
+    with pool_cls(max_workers=config.max_workers) as pool:
+        futures = {name: pool.submit(_timed_fit, model, X_fit, y_fit, sample_weight)
+                   for name, model in models.items()}
+        fitted = {name: future.result() for name, future in futures.items()}
+    fit_times = {name: seconds for name, (_, seconds) in fitted.items()}
+    tree, forest, gnb = (fitted[name][0] for name in ALGORITHMS)
+    # n_jobs only speeds up fitting; single-row predictions are faster serially
+    forest.n_jobs = None
 
+    scores = {
+        'train': tree.score(X_train, y_train),
+        'test': accuracy_score(y_test, tree.predict(X_test)),
+    }
     if verbose:
-        print(f' Train score: {round(_MODEL_TREE.score(X_train, y_train), 2) * 100}')
-        print(f' Test score: {round(_MODEL_TREE.score(X_test, y_test), 2) * 100}')
-        tree_predict = _MODEL_TREE.predict(X_test)
-        print(f'accuracy_score: {round(accuracy_score(y_test, tree_predict),2)*100} %')
+        print(f' Train score: {round(scores["train"], 2) * 100}')
+        print(f' Test score: {round(scores["test"], 2) * 100}')
+        print(f'accuracy_score: {round(scores["test"],2)*100} %')
+        for name, seconds in fit_times.items():
+            print(f' Fit time {name}: {seconds:.3f}s')
 
-    return _MODEL_TREE, _MODEL_FOREST, _MODEL_GNB, _SYMPTOMS, _DISEASE
+    return {
+        'format': _ARTIFACT_FORMAT,
+        'version': model_version(config),
+        'sklearn_version': _sklearn_version(),
+        'tree': tree,
+        'forest': forest,
+        'gnb': gnb,
+        'symptoms': data['symptoms'],
+        'disease': data['disease'],
+        'label_mapping': data['label_mapping'],
+        'scores': scores,
+        'config': asdict(config),
+        'fit_times': fit_times,
+        'cooccurrence': CooccurrenceIndex(X_train, y_train, len(data['disease'])).to_arrays(),
+        'exact_match': ExactMatchIndex(X_train, y_train, len(data['disease'])).to_arrays(),
+        'train_seconds': time.perf_counter() - start,
+    }
 
 
-def predict_symptoms(input_symptoms, algorithm='tree'):
-    """Return predicted disease name given an iterable of symptom strings.
+def save_models(payload, path=None):
+    """Write an artifact payload to ``path`` atomically and return the path."""
+    if path is None:
+        path = artifact_path(payload['version'])
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    import joblib
+
+    # Uncompressed so numpy arrays inside the estimators can be memory-mapped
+    joblib.dump(payload, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_models(path):
+    """Load an artifact payload, memory-mapping its arrays where possible.
+
+    Returns None if the file is missing or was written by an incompatible
+    artifact format or scikit-learn version.
+    """
+    if not os.path.exists(path):
+        return None
+    import joblib
+
+    payload = joblib.load(path, mmap_mode='r')
+    if (payload.get('format') != _ARTIFACT_FORMAT
+            or payload.get('sklearn_version') != _sklearn_version()):
+        return None
+    return payload
+
+
+class PredictionCache:
+    """Thread-safe bounded LRU cache for prediction results with optional TTL.
+
+    ``maxsize=0`` disables caching; ``ttl`` is in seconds (None = no expiry).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, maxsize=4096, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value or ``PredictionCache._MISSING``."""
+        with self._lock:
+            item = self._data.get(key, self._MISSING)
+            if item is self._MISSING:
+                self.misses += 1
+                return item
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return self._MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by every caller in the process (Streamlit sessions, Tk UI, scripts)
+_PREDICTION_CACHE = PredictionCache()
+
+
+def configure_prediction_cache(maxsize=4096, ttl=None):
+    """Replace the shared prediction cache with a new, empty one."""
+    global _PREDICTION_CACHE
+    _PREDICTION_CACHE = PredictionCache(maxsize=maxsize, ttl=ttl)
+    return _PREDICTION_CACHE
+
+
+def prediction_cache_stats():
+    """Return hit/miss/eviction counters of the shared prediction cache."""
+    return _PREDICTION_CACHE.stats()
+
+
+class LatencyHistogram:
+    """HDR-style latency histogram over integer nanoseconds.
+
+    Each power of two is split into ``2**_SUB_BITS`` linear buckets, so any
+    recorded value is reported within 1/8 (12.5%) of its true value while the
+    whole range from 1 ns to hours fits in a few hundred counters.
+    """
+
+    _SUB_BITS = 3
+    _SIZE = (64 << _SUB_BITS) + (2 << _SUB_BITS)
+
+    def __init__(self):
+        self.counts = [0] * self._SIZE
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def _index(cls, ns):
+        shift = max(ns.bit_length() - cls._SUB_BITS - 1, 0)
+        return (shift << cls._SUB_BITS) + (ns >> shift)
+
+    @classmethod
+    def _upper(cls, index):
+        # largest value that falls into bucket ``index``
+        if index < (2 << cls._SUB_BITS):
+            return index
+        shift = (index >> cls._SUB_BITS) - 1
+        mantissa = index - (shift << cls._SUB_BITS)
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, ns):
+        self.counts[self._index(ns)] += 1
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
 
-    The function will build models on first call (lazily).
+    def quantile(self, q):
+        """Return the ``q`` quantile in nanoseconds (0 when empty)."""
+        if not self.count:
+            return 0
+        rank = max(1, int(np.ceil(q * self.count)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(self._upper(index), self.max)
+        return self.max
+
+
+class Metrics:
+    """Thread-safe stage latency histograms, counters and build/load durations."""
+
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.durations = {}
+
+    def observe(self, stage, ns):
+        with self._lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = LatencyHistogram()
+            hist.record(ns)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def duration(self, name, seconds):
+        """Record a one-off duration such as a model load; the last value is kept."""
+        with self._lock:
+            self.durations[name] = seconds
+
+    def snapshot(self):
+        with self._lock:
+            stages = {
+                name: {
+                    'count': h.count,
+                    'total_s': h.total / 1e9,
+                    'mean_s': h.total / h.count / 1e9,
+                    'max_s': h.max / 1e9,
+                    **{f'p{q * 100:g}_s': h.quantile(q) / 1e9 for q in self.QUANTILES},
+                }
+                for name, h in self.stages.items()
+            }
+            return {'stages': stages, 'counters': dict(self.counters),
+                    'durations': dict(self.durations)}
+
+
+# None while instrumentation is off: hot paths only test for None
+_METRICS = Metrics() if os.environ.get('PEP_METRICS') else None
+
+
+def enable_instrumentation(enabled=True):
+    """Turn prediction instrumentation on (with fresh, empty metrics) or off.
+
+    It is off by default (set ``PEP_METRICS=1`` to start with it on). Returns
+    the active ``Metrics`` object or None.
+    """
+    global _METRICS
+    _METRICS = Metrics() if enabled else None
+    return _METRICS
+
+
+def get_stats():
+    """Return instrumentation results plus the prediction cache counters.
+
+    ``stages`` maps each timed stage (``encode``, ``cache``, ``model.<algorithm>``,
+    ``vote`` and the ``total.<entry point>`` wall time) to its count, total,
+    mean, max and p50/p90/p99/p99.9 latency in seconds. ``counters`` holds
+    calls per entry point and rows scored per algorithm; ``durations`` the
+    latest model load, training and update times.
+    """
+    metrics = _METRICS
+    stats = metrics.snapshot() if metrics is not None else {
+        'stages': {}, 'counters': {}, 'durations': {}}
+    stats['enabled'] = metrics is not None
+    stats['cache'] = prediction_cache_stats()
+    return stats
+
+
+# counter name prefix -> (Prometheus metric, label)
+_PROM_COUNTERS = {'calls': ('pep_calls_total', 'entry'), 'rows': ('pep_rows_total', 'algorithm')}
+
+
+def prometheus_text():
+    """Return ``get_stats()`` in the Prometheus text exposition format."""
+    stats = get_stats()
+    lines = ['# HELP pep_stage_seconds Prediction stage latency.',
+             '# TYPE pep_stage_seconds summary']
+    for name, s in sorted(stats['stages'].items()):
+        for q in Metrics.QUANTILES:
+            lines.append(f'pep_stage_seconds{{stage="{name}",quantile="{q:g}"}} '
+                         f'{s[f"p{q * 100:g}_s"]:.9g}')
+        lines.append(f'pep_stage_seconds_sum{{stage="{name}"}} {s["total_s"]:.9g}')
+        lines.append(f'pep_stage_seconds_count{{stage="{name}"}} {s["count"]}')
+    for prefix, (metric, label) in _PROM_COUNTERS.items():
+        lines.append(f'# TYPE {metric} counter')
+        for name, value in sorted(stats['counters'].items()):
+            kind, _, detail = name.partition('.')
+            if kind == prefix:
+                lines.append(f'{metric}{{{label}="{detail}"}} {value}')
+    lines.append('# HELP pep_duration_seconds Latest model build, load and update durations.')
+    lines.append('# TYPE pep_duration_seconds gauge')
+    for name, value in sorted(stats['durations'].items()):
+        lines.append(f'pep_duration_seconds{{event="{name}"}} {value:.9g}')
+    cache = stats['cache']
+    lines += ['# TYPE pep_cache_hits_total counter', f'pep_cache_hits_total {cache["hits"]}',
+              '# TYPE pep_cache_misses_total counter', f'pep_cache_misses_total {cache["misses"]}']
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path=None):
+    """Atomically write ``prometheus_text()`` to ``path`` (default ``PEP_METRICS_FILE``).
+
+    Point the node_exporter textfile collector at the file to scrape it.
+    Returns the path.
+    """
+    path = path or os.environ.get('PEP_METRICS_FILE')
+    if not path:
+        raise ValueError('no path given and PEP_METRICS_FILE is not set')
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as fh:
+        fh.write(prometheus_text())
+    os.replace(tmp_path, path)
+    return path
+
+
+@dataclass(frozen=True, eq=False)
+class ModelBundle:
+    """One immutable, versioned set of fitted models with its vocabulary.
+
+    ``tree``, ``forest`` and ``gnb`` are None for bundles loaded with
+    ``load_compiled_models``, which only carry the compiled engine.
+    ``feature_map`` is set on compacted bundles (see ``compact_models``): the
+    model feature column of each symptom, or -1 for symptoms the models ignore.
+    """
+
+    version: str
+    tree: object
+    forest: object
+    gnb: object
+    symptoms: tuple
+    disease: tuple
+    payload: dict = field(default=None, repr=False)
+    feature_map: tuple = field(default=None, repr=False)
+    symptom_index: MappingProxyType = field(init=False, repr=False)
+    # symptom -> model feature column; the same as symptom_index unless compacted
+    feature_index: MappingProxyType = field(init=False, repr=False)
+    # lazily compiled engine models and the co-occurrence index, shared by
+    # every thread using the bundle
+    _compiled: dict = field(default_factory=dict, repr=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'symptom_index',
+                           MappingProxyType({s: i for i, s in enumerate(self.symptoms)}))
+        if self.feature_map is None:
+            object.__setattr__(self, 'feature_index', self.symptom_index)
+            return
+        fmap = np.asarray(self.feature_map, dtype=np.intp)
+        object.__setattr__(self, 'feature_index', MappingProxyType(
+            {s: int(c) for s, c in zip(self.symptoms, fmap) if c >= 0}))
+        # projection of symptom columns: the first symptom of every feature is
+        # gathered, the other symptoms merged into it are OR-ed in afterwards
+        kept = np.flatnonzero(fmap >= 0)
+        first = np.full(int(fmap.max()) + 1, -1, dtype=np.intp)
+        for col in kept[::-1]:
+            first[fmap[col]] = col
+        merged = kept[first[fmap[kept]] != kept]
+        object.__setattr__(self, '_projection', (first, merged, fmap[merged]))
+
+    @classmethod
+    def from_payload(cls, payload):
+        feature_map = payload.get('feature_map')
+        return cls(payload['version'], payload['tree'], payload['forest'], payload['gnb'],
+                   tuple(payload['symptoms']), tuple(payload['disease']), payload,
+                   None if feature_map is None else tuple(feature_map))
+
+    @property
+    def has_estimators(self):
+        return self.tree is not None
+
+    @property
+    def n_features(self):
+        """Number of model feature columns."""
+        if self.feature_map is None:
+            return len(self.symptoms)
+        return len(self._projection[0])
+
+    def project(self, X):
+        """Map a 0/1 matrix in ``symptoms`` column order onto the model features."""
+        if self.feature_map is None:
+            return X
+        first, merged, target = self._projection
+        out = X[:, first]
+        for col, feature in zip(merged, target):
+            # maximum rather than |= so float 0/1 matrices work as with full bundles
+            np.maximum(out[:, feature], X[:, col], out=out[:, feature])
+        return out
+
+    def models(self):
+        """Return ``{algorithm: fitted estimator}``."""
+        return {'tree': self.tree, 'random': self.forest, 'gnb': self.gnb}
+
+    def _index(self, name):
+        # an index stored with the models, or built from the training data if missing
+        index = self._compiled.get(name)
+        if index is None:
+            cls = _INDEXES[name]
+            arrays = (self.payload or {}).get(name)
+            if arrays is not None:
+                index = cls.from_arrays(arrays)
+            else:
+                data = load_training_data()
+                index = cls(data['X_train'], data['y_train'], len(self.disease))
+            index = self._compiled.setdefault(name, index)
+        return index
+
+    def cooccurrence(self):
+        """Return the ``CooccurrenceIndex`` stored with the models."""
+        return self._index('cooccurrence')
+
+    def exact_match(self):
+        """Return the ``ExactMatchIndex`` stored with the models (None if compacted)."""
+        if self.feature_map is not None:
+            # merged columns change which inputs count as the same profile
+            return None
+        return self._index('exact_match')
+
+    def compiled(self):
+        """Return ``{algorithm: compiled model}``, compiling on first use."""
+        compiled = self._compiled.get('models')
+        if compiled is None:
+            compiled = {
+                'tree': CompiledForest.from_sklearn(self.tree),
+                'random': CompiledForest.from_sklearn(self.forest),
+                'gnb': CompiledGNB(self.gnb),
+            }
+            # two threads may compile at once; both results are equivalent
+            compiled = self._compiled.setdefault('models', compiled)
+        return compiled
+
+
+class ModelRegistry:
+    """Thread-safe store of ``ModelBundle`` versions with one active bundle.
+
+    Building or loading goes through a single-flight lock, so concurrent cold
+    callers wait for one build instead of each training. Installing a bundle
+    swaps a single reference (hot swap); in-flight predictions finish on the
+    bundle they started with. Inactive versions stay available to
+    ``get(version)`` for side-by-side (A/B) scoring; beyond ``max_inactive``
+    the oldest ones are dropped.
+    """
+
+    def __init__(self, max_inactive=3):
+        self.max_inactive = max_inactive
+        self._bundles = OrderedDict()
+        self._active = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @property
+    def active(self):
+        """The active bundle, or None before anything was loaded."""
+        return self._active
+
+    def get(self, version=None):
+        """Return the bundle for ``version``; the active one (loaded on first use) by default."""
+        if version is None:
+            bundle = self._active
+            return bundle if bundle is not None else self.load()
+        try:
+            return self._bundles[version]
+        except KeyError:
+            raise KeyError(f'no model bundle with version {version!r}') from None
+
+    def versions(self):
+        return list(self._bundles)
+
+    def load(self, verbose=False, config=None, activate=True, version=None):
+        """Load the artifact for ``config`` (training it if missing) exactly once.
+
+        ``version`` loads that artifact instead (it is never trained); without
+        either, ``default_version()`` is loaded. Returns the existing bundle
+        when that version is already registered.
+        """
+        with self._build_lock:
+            if version is None:
+                version = model_version(config) if config is not None else default_version()
+            bundle = self._bundles.get(version)
+            if bundle is None or not bundle.has_estimators:
+                bundle = self.install(_load_or_train(version, verbose, config), activate=False)
+            if activate:
+                self.activate(bundle.version)
+            return bundle
+
+    def with_estimators(self, bundle, verbose=False):
+        """Return ``bundle`` with its sklearn estimators, loading them exactly once.
+
+        Compiled-only bundles (``load_compiled_models``) get their artifact
+        loaded under the single-flight lock; concurrent callers wait for it.
+        """
+        with self._build_lock:
+            current = self._bundles.get(bundle.version, bundle)
+            if current.has_estimators:
+                return current
+            return self.install(_load_or_train(bundle.version, verbose),
+                                activate=self._active is current)
+
+    def install(self, bundle, activate=True):
+        """Register a bundle (or artifact payload) and optionally make it active."""
+        if not isinstance(bundle, ModelBundle):
+            bundle = ModelBundle.from_payload(bundle)
+        with self._lock:
+            previous = self._bundles.get(bundle.version)
+            if previous is not None and not bundle._compiled:
+                # keep e.g. memory-mapped compiled arrays loaded for this version
+                bundle._compiled.update(previous._compiled)
+            self._bundles[bundle.version] = bundle
+            self._bundles.move_to_end(bundle.version)
+            if activate:
+                self._activate(bundle)
+            self._evict()
+        return bundle
+
+    def activate(self, version):
+        """Make a registered version the one served by default."""
+        with self._lock:
+            self._activate(self.get(version))
+
+    def remove(self, version):
+        with self._lock:
+            if self._active is not None and self._active.version == version:
+                raise ValueError(f'cannot remove the active model version {version!r}')
+            self._bundles.pop(version, None)
+
+    def _activate(self, bundle):
+        # a single reference assignment: readers see the old or the new bundle
+        self._active = bundle
+        # results computed by the previous models must not be served any more
+        _PREDICTION_CACHE.clear()
+
+    def _evict(self):
+        inactive = [v for v in self._bundles if self._active is None or v != self._active.version]
+        for version in inactive[:max(0, len(inactive) - self.max_inactive)]:
+            del self._bundles[version]
+
+
+# Shared by every caller in the process
+REGISTRY = ModelRegistry()
+
+
+def _load_or_train(version, verbose=False, config=None):
+    path = artifact_path(version)
+    start = time.perf_counter()
+    payload = load_models(path)
+    if payload is None:
+        if version != model_version(config):
+            # training would produce a different version than the one asked for
+            raise RuntimeError(f'No model artifact at {path}; export version {version} first '
+                               '(`python PEP.py train`/`compact` print the path they write)')
+        if os.environ.get('PEP_NO_TRAIN'):
+            raise RuntimeError(f'No model artifact at {path}; run `python PEP.py train` first')
+        payload = train_models(verbose=verbose, config=config)
+        save_models(payload, path)
+        event = 'train'
+    else:
+        event = 'artifact_load'
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.duration(event, time.perf_counter() - start)
+    if verbose and event == 'artifact_load':
+        print(f' Loaded models {payload["version"]} from {path}')
+        print(f' Train score: {round(payload["scores"]["train"], 2) * 100}')
+        print(f' Test score: {round(payload["scores"]["test"], 2) * 100}')
+    return payload
+
+
+def _bundle(version=None, engine=None):
+    """Return the bundle to predict with, making sure it can serve ``engine``."""
+    bundle = REGISTRY.get(version)
+    if not bundle.has_estimators and (engine or DEFAULT_ENGINE) != 'compiled':
+        # compiled-only processes (load_compiled_models) load sklearn on demand
+        bundle = REGISTRY.with_estimators(bundle)
+    return bundle
+
+
+def build_models(verbose=False, config=None, version=None):
+    """Build and return (tree, forest, gnb, symptoms, disease).
+
+    The models are kept in the shared ``REGISTRY`` so repeated calls are cheap.
+    A fresh process loads the exported artifact for the current data and ``config``
+    (a ``TrainConfig``) if one exists and only trains (and exports) when it does
+    not. Set ``PEP_NO_TRAIN=1`` to make a missing artifact an error instead, e.g.
+    for production workers. ``version`` (default ``PEP_MODEL_VERSION``) loads
+    an exported artifact by version, e.g. one trained with a non-default
+    config or written by ``compact_models``; it is never trained. Passing
+    ``config`` or ``version`` activates those models if others are active.
+    """
+    bundle = REGISTRY.active
+    wanted = version or (model_version(config) if config is not None else None)
+    if (bundle is None or not bundle.has_estimators
+            or (wanted is not None and bundle.version != wanted)):
+        bundle = REGISTRY.load(verbose=verbose, config=config, version=version)
+    return bundle.tree, bundle.forest, bundle.gnb, list(bundle.symptoms), list(bundle.disease)
+
+
+def export_models(path=None, verbose=False, config=None):
+    """Retrain from the CSVs, write the artifact and install the new models.
+
+    Returns the artifact path. This is the explicit training entry point; it
+    ignores any existing artifact.
     """
-    global _MODEL_TREE, _MODEL_FOREST, _MODEL_GNB, _SYMPTOMS, _DISEASE
-    if _MODEL_TREE is None:
-        # build models silently
-        build_models(verbose=False)
+    payload = train_models(verbose=verbose, config=config)
+    path = save_models(payload, path)
+    REGISTRY.install(payload)
+    return path
+
+
+_UPDATE_EXECUTOR = None
+_UPDATE_LOCK = threading.Lock()
+
+
+def _labelled_rows(bundle, records, labels=None):
+    """Encode new labelled cases into (X, y) using the bundle's vocabulary."""
+    if labels is None:
+        # a DataFrame in the training.csv layout, labels in 'prognosis'
+        frame = records.set_axis([_clean_column(str(c)) for c in records.columns], axis=1)
+        missing = sorted(set(bundle.symptoms + ('prognosis',)) - set(frame.columns))
+        if missing:
+            raise ValueError(f'missing column(s): {", ".join(missing)}')
+        X = frame[list(bundle.symptoms)].to_numpy(dtype=np.uint8)
+        labels = frame['prognosis'].tolist()
+    else:
+        X = _encode_records(records, bundle)
+        labels = list(labels)
+    if len(labels) != X.shape[0]:
+        raise ValueError(f'got {X.shape[0]} records but {len(labels)} labels')
+    index = {_norm_label(d): i for i, d in enumerate(bundle.disease)}
+    y = np.array([index.get(_norm_label(label), -1) for label in labels], dtype=np.int64)
+    if (y < 0).any():
+        unknown = sorted({str(lb) for lb, i in zip(labels, y) if i < 0})
+        raise ValueError(f'unknown disease label(s): {", ".join(unknown)}')
+    return X, y
+
 
-    # ensure symptoms list is available
-    if _SYMPTOMS is None:
-        build_models()
+def update_models(records, labels=None, n_new_trees=10, verbose=False):
+    """Fold newly confirmed cases into the installed models without a full retrain.
 
-    # normalize input
-    if not isinstance(input_symptoms, (list, set, tuple)):
+    ``records`` is either a DataFrame in the ``training.csv`` layout (labels
+    taken from its ``prognosis`` column) or an iterable of symptom collections
+    with matching disease names in ``labels``. In a background thread:
+
+    * GaussianNB is updated with ``partial_fit`` on the new rows;
+    * ``n_new_trees`` trees are added to the RandomForest with ``warm_start``
+      (fitted on the accumulated data so each tree still sees every class);
+    * the decision tree is refitted on the accumulated data, concurrently.
+
+    The result is installed in ``REGISTRY`` as a new bundle version, so
+    concurrent predictions see either the old models or the new ones, never a
+    mix. Updates are applied one at a time, in submission order, each on top
+    of the bundle active when it runs, and live in this process only.
+    Returns a ``concurrent.futures.Future`` whose result is a report dict
+    (``seconds``, ``fit_times``, ``version`` and, when the installed artifact
+    recorded it, ``cold_seconds`` and ``speedup`` over a full retrain).
+    """
+    global _UPDATE_EXECUTOR
+    bundle = _bundle()
+    if bundle.feature_map is not None:
+        raise ValueError('cannot update compacted models; update the full models and '
+                         'compact them again')
+    X, y = _labelled_rows(bundle, records, labels)
+    if not len(y):
+        raise ValueError('no records to update the models with')
+    with _UPDATE_LOCK:
+        if _UPDATE_EXECUTOR is None:
+            _UPDATE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pep-update')
+    return _UPDATE_EXECUTOR.submit(_apply_update, X, y, n_new_trees, verbose)
+
+
+def _apply_update(X_new, y_new, n_new_trees, verbose):
+    from sklearn.metrics import accuracy_score
+    from sklearn.tree import DecisionTreeClassifier
+
+    start = time.perf_counter()
+    payload = _bundle().payload
+    config = TrainConfig(**payload['config'])
+    previous = payload.get('updates')
+    if previous is not None:
+        X_new = np.concatenate([previous['X'], X_new])
+        y_new = np.concatenate([previous['y'], y_new])
+    data = load_training_data()
+    X_all = np.concatenate([data['X_train'], X_new])
+    y_all = np.concatenate([data['y_train'], y_new])
+    added = len(X_new) - (0 if previous is None else len(previous['X']))
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        tree_future = pool.submit(
+            _timed_fit, DecisionTreeClassifier(random_state=config.random_state), X_all, y_all)
+
+        t0 = time.perf_counter()
+        gnb = copy.deepcopy(payload['gnb'])
+        gnb.partial_fit(X_new[len(X_new) - added:], y_new[len(y_new) - added:])
+        gnb_seconds = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        forest = copy.deepcopy(payload['forest'])
+        forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + n_new_trees)
+        forest.fit(X_all, y_all)
+        forest.set_params(warm_start=False)
+        forest_seconds = time.perf_counter() - t0
+
+        tree, tree_seconds = tree_future.result()
+
+    h = hashlib.sha256(payload['version'].encode())
+    h.update(X_new.tobytes())
+    h.update(y_new.tobytes())
+    fit_times = {'tree': tree_seconds, 'random': forest_seconds, 'gnb': gnb_seconds}
+    updated = dict(
+        payload,
+        version=h.hexdigest()[:16],
+        tree=tree,
+        forest=forest,
+        gnb=gnb,
+        scores={'train': tree.score(X_all, y_all),
+                'test': accuracy_score(data['y_test'], tree.predict(data['X_test']))},
+        fit_times=fit_times,
+        updates={'X': X_new, 'y': y_new},
+        cooccurrence=CooccurrenceIndex(X_all, y_all, len(payload['disease'])).to_arrays(),
+        exact_match=ExactMatchIndex(X_all, y_all, len(payload['disease'])).to_arrays(),
+        base_version=payload.get('base_version', payload['version']),
+    )
+    REGISTRY.install(updated)
+    seconds = time.perf_counter() - start
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.duration('update', seconds)
+
+    report = {'version': updated['version'], 'rows': added, 'total_update_rows': len(X_new),
+              'seconds': seconds, 'fit_times': fit_times}
+    cold = payload.get('train_seconds')
+    if cold:
+        report['cold_seconds'] = cold
+        report['speedup'] = cold / seconds
+    if verbose:
+        extra = f', {report["speedup"]:.1f}x faster than a full retrain' if cold else ''
+        print(f' Updated models with {added} rows in {seconds:.3f}s{extra}')
+    return report
+
+
+class UnknownSymptomError(ValueError):
+    """Raised when an input contains symptom names the models do not know."""
+
+    def __init__(self, unknown):
+        self.unknown = sorted(set(unknown))
+        super().__init__(f'unknown symptom(s): {", ".join(self.unknown)}')
+
+
+def _as_symptom_iterable(input_symptoms):
+    if isinstance(input_symptoms, str):
+        return (input_symptoms,)
+    if not isinstance(input_symptoms, (list, set, frozenset, tuple)):
         try:
-            input_symptoms = list(input_symptoms)
+            return list(input_symptoms)
         except Exception:
-            input_symptoms = [input_symptoms]
+            return (input_symptoms,)
+    return input_symptoms
+
+
+def symptom_index():
+    """Return the read-only ``symptom -> feature column`` mapping."""
+    return REGISTRY.get().symptom_index
+
+
+def encode_symptoms(input_symptoms, out=None):
+    """Encode symptom names into a 0/1 uint8 feature row.
+
+    Pass a preallocated ``out`` row (e.g. from a previous call) to reuse it;
+    it is cleared before encoding. Raises UnknownSymptomError for names that
+    are not model features rather than silently dropping them.
+    """
+    return _encode_row(input_symptoms, symptom_index(), out)
+
+
+def _encode_row(input_symptoms, index, out=None, known=None):
+    # ``known``: names missing from ``index`` that are valid but ignored
+    if out is None:
+        out = np.zeros(len(index), dtype=np.uint8)
+    else:
+        out[:] = 0
+    unknown = []
+    for s in _as_symptom_iterable(input_symptoms):
+        col = index.get(str(s))
+        if col is not None:
+            out[col] = 1
+        elif known is None or str(s) not in known:
+            unknown.append(str(s))
+    if unknown:
+        raise UnknownSymptomError(unknown)
+    return out
+
+
+def symptom_bitset(input_symptoms):
+    """Encode symptom names as a packed integer with bit ``i`` = column ``i``."""
+    return _symptom_bits(input_symptoms, symptom_index())
+
+
+def _symptom_bits(input_symptoms, index):
+    bits = 0
+    unknown = []
+    for s in _as_symptom_iterable(input_symptoms):
+        col = index.get(str(s))
+        if col is None:
+            unknown.append(str(s))
+        else:
+            bits |= 1 << col
+    if unknown:
+        raise UnknownSymptomError(unknown)
+    return bits
+
+
+def bitset_to_row(bits, out=None):
+    """Expand a packed symptom bitset back into a uint8 feature row."""
+    if out is None:
+        n = len(symptom_index())
+        out = np.zeros(n, dtype=np.uint8)
+    else:
+        out[:] = 0
+    col = 0
+    while bits:
+        if bits & 1:
+            out[col] = 1
+        bits >>= 1
+        col += 1
+    return out
+
+
+class _ArrayState:
+    """Save and restore an object as the dict of NumPy arrays named in ``_ARRAYS``.
+
+    Used for the compiled models and the indexes stored with them;
+    ``from_arrays`` does not copy, so the arrays may be memory-mapped.
+    """
+
+    _ARRAYS = ()
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in self._ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        self = cls.__new__(cls)
+        for name in cls._ARRAYS:
+            setattr(self, name, arrays[name])
+        return self
+
+    @property
+    def nbytes(self):
+        """Total size of the arrays."""
+        return sum(arr.nbytes for arr in self.to_arrays().values())
+
+
+class CompiledForest(_ArrayState):
+    """Flat NumPy copy of one or more fitted sklearn decision trees.
+
+    All trees are concatenated into contiguous ``feature``/``threshold``/
+    ``left``/``right`` arrays and a batch is evaluated level by level for every
+    tree at once. Leaves point to themselves, so rows that reach a leaf early
+    simply stay there. Predictions match ``predict``/``predict_proba`` of the
+    source estimator exactly.
+    """
+
+    # batches up to this many (row, node) pairs resolve every branch up front
+    _SUCCESSOR_LIMIT = 1 << 18
+    # rows per block when summing leaf probabilities over trees
+    _PROBA_BLOCK = 1024
+
+    def __init__(self, estimators, classes):
+        self.classes_ = np.asarray(classes)
+        self.n_trees = len(estimators)
+        n_classes = len(self.classes_)
+        features, thresholds, lefts, rights, probas, leaf_classes, roots = [], [], [], [], [], [], []
+        offset = 0
+        self.max_depth = 0
+        for est in estimators:
+            t = est.tree_
+            n = t.node_count
+            is_leaf = t.children_left < 0
+            own = np.arange(offset, offset + n, dtype=np.int32)
+            features.append(np.where(is_leaf, 0, t.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, t.threshold))
+            lefts.append(np.where(is_leaf, own, t.children_left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, own, t.children_right + offset).astype(np.int32))
+            value = np.asarray(t.value[:, 0, :n_classes], dtype=np.float64)
+            leaf_classes.append(np.argmax(value, axis=1))
+            # Older sklearn stores class counts and normalises in predict_proba;
+            # newer versions store fractions already. Mirror whichever applies.
+            if not np.allclose(value[is_leaf].sum(axis=1), 1.0):
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            probas.append(value)
+            roots.append(offset)
+            offset += n
+            self.max_depth = max(self.max_depth, int(t.max_depth))
+        self.node_count = offset
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.is_leaf = self.left == np.arange(offset)
+        # interleaved (left, right) pairs indexed by 2 * node + go_right
+        self.children = np.stack([self.left, self.right], axis=1).ravel()
+        # every split threshold lies strictly between 0 and 1 (binary symptoms)
+        split_thresholds = self.threshold[~self.is_leaf]
+        self.binary_splits = bool(((split_thresholds > 0) & (split_thresholds < 1)).all())
+        self.leaf_proba = np.concatenate(probas)
+        self.leaf_class = np.concatenate(leaf_classes).astype(np.intp)
+        self.roots = np.asarray(roots, dtype=np.int32)
+
+    _ARRAYS = ('classes_', 'feature', 'threshold', 'left', 'right', 'children', 'is_leaf',
+               'leaf_proba', 'leaf_class', 'roots')
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Compile a DecisionTreeClassifier or RandomForestClassifier."""
+        estimators = getattr(model, 'estimators_', None) or [model]
+        return cls(estimators, model.classes_)
+
+    def to_arrays(self):
+        """Return the flat arrays (and scalars as 0-d arrays) describing the model."""
+        arrays = {name: arr for name, arr in super().to_arrays().items() if arr is not None}
+        arrays['max_depth'] = np.asarray(self.max_depth)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild from ``to_arrays`` output without copying, e.g. memory-mapped arrays."""
+        # compact() may have dropped leaf_proba
+        self = super().from_arrays(dict(arrays, leaf_proba=arrays.get('leaf_proba')))
+        self.max_depth = int(np.asarray(arrays['max_depth']).reshape(-1)[0])
+        self.n_trees = len(self.roots)
+        self.node_count = len(self.feature)
+        split_thresholds = self.threshold[~self.is_leaf]
+        self.binary_splits = bool(((split_thresholds > 0) & (split_thresholds < 1)).all())
+        return self
+
+    def compact(self):
+        """Return a copy with the smallest index dtypes and, if possible, no probability table.
+
+        Feature ids and leaf classes are narrowed to the smallest unsigned
+        integer type that holds them. When every leaf is pure (one class with
+        probability 1, as in fully grown trees) ``leaf_proba`` is dropped and
+        ``predict_proba`` counts leaf classes instead, with identical results.
+        """
+        new = copy.copy(self)
+        new.feature = self.feature.astype(np.min_scalar_type(int(self.feature.max())))
+        new.leaf_class = self.leaf_class.astype(np.min_scalar_type(max(len(self.classes_) - 1, 0)))
+        if self.leaf_proba is not None:
+            leaf_proba = self.leaf_proba[self.is_leaf]
+            if np.all((leaf_proba == 0.0) | (leaf_proba == 1.0)):
+                new.leaf_proba = None
+        return new
+
+    def apply(self, X):
+        """Return the leaf index reached by every row, shape (n_trees, n_rows)."""
+        X = np.asarray(X)
+        if X.ndim != 2:
+            raise ValueError(f'expected a 2-D feature matrix, got shape {X.shape}')
+        binary = (self.binary_splits and X.dtype.kind in 'bui'
+                  and (X.size == 0 or (X.min() >= 0 and X.max() <= 1)))
+        if binary:
+            # 0/1 inputs against thresholds in (0, 1): the feature value itself
+            # selects the child (0 = left, 1 = right)
+            X = X.astype(np.uint8, copy=False)
+        else:
+            # sklearn compares float32 features against float64 thresholds
+            X = np.asarray(X, dtype=np.float32)
+        if X.shape[0] * self.node_count <= self._SUCCESSOR_LIMIT:
+            return self._apply_successors(X, binary)
+        return self._apply_levels(X, binary)
+
+    def _apply_successors(self, X, binary):
+        # Small batches: decide every node's branch for every row in one pass,
+        # then each level is a single gather through the successor table.
+        n = X.shape[0]
+        go_right = X[:, self.feature] if binary else X[:, self.feature] > self.threshold
+        successor = np.where(go_right, self.right, self.left)
+        offsets = np.arange(n, dtype=np.int32) * np.int32(self.node_count)
+        if n > 1:
+            successor += offsets[:, np.newaxis]
+        successor = successor.ravel()
+        # node ids in row-major (row, tree) order so they index the flat table
+        node = (self.roots + offsets[:, np.newaxis]).ravel()
+        for step in range(self.max_depth):
+            node = successor[node]
+            if step % 8 == 7 and (successor[node] == node).all():
+                break
+        return (node.reshape(n, self.n_trees) - offsets[:, np.newaxis]).T
+
+    def _apply_levels(self, X, binary):
+        # Large batches: advance all (tree, row) pairs one level per step and
+        # periodically drop the pairs that have reached a leaf.
+        n, n_features = X.shape
+        flat_x = X.ravel()
+        leaves = np.repeat(self.roots[:, np.newaxis], n, axis=1).ravel()
+        position = np.arange(leaves.size)
+        node = leaves.copy()
+        row_offset = np.tile(np.arange(n, dtype=np.int32) * np.int32(n_features), self.n_trees)
+        for step in range(self.max_depth):
+            x = flat_x[row_offset + self.feature[node]]
+            if binary:
+                node = self.children[2 * node + x]
+            else:
+                node = np.where(x > self.threshold[node], self.right[node], self.left[node])
+            if step % 8 == 7:
+                done = self.is_leaf[node]
+                if done.all():
+                    break
+                if done.any():
+                    leaves[position[done]] = node[done]
+                    keep = ~done
+                    node, position, row_offset = node[keep], position[keep], row_offset[keep]
+        leaves[position] = node
+        return leaves.reshape(self.n_trees, n)
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+        if self.leaf_proba is None:
+            return self._count_proba(leaves)
+        if self.n_trees == 1:
+            return self.leaf_proba[leaves[0]]
+        proba = np.empty((leaves.shape[1], len(self.classes_)))
+        for start in range(0, leaves.shape[1], self._PROBA_BLOCK):
+            block = self.leaf_proba[leaves[:, start:start + self._PROBA_BLOCK]]
+            # summing over the tree axis adds trees one after another in
+            # estimator order, matching sklearn's accumulation bit for bit
+            proba[start:start + self._PROBA_BLOCK] = block.sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def _count_proba(self, leaves):
+        # pure leaves: each tree contributes 1 to its leaf's class, which adds
+        # up to exactly the sum sklearn computes from one-hot probabilities
+        n_classes = len(self.classes_)
+        n = leaves.shape[1]
+        flat = self.leaf_class[leaves].astype(np.intp) + np.arange(n) * n_classes
+        proba = np.bincount(flat.ravel(), minlength=n * n_classes).reshape(n, n_classes)
+        return proba / self.n_trees
+
+    def predict(self, X):
+        if self.n_trees == 1:
+            return self.classes_[self.leaf_class[self.apply(X)[0]]]
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+
+class CompiledGNB(_ArrayState):
+    """NumPy evaluation of a fitted GaussianNB without sklearn input checks."""
+
+    # rows scored per block, bounding the (rows, classes, features) temporary
+    _BLOCK = 256
+
+    def __init__(self, model):
+        self.classes_ = np.asarray(model.classes_)
+        self.theta = np.asarray(model.theta_, dtype=np.float64)
+        self.var = np.asarray(model.var_, dtype=np.float64)
+        # per-class constant terms, computed as GaussianNB._joint_log_likelihood
+        # does and added in the same order so results are bit-identical
+        self.log_prior = np.log(np.asarray(model.class_prior_, dtype=np.float64))
+        self.log_norm = np.array([
+            -0.5 * np.sum(np.log(2.0 * np.pi * self.var[i, :]))
+            for i in range(len(self.classes_))
+        ])
+
+    _ARRAYS = ('classes_', 'theta', 'var', 'log_prior', 'log_norm')
+
+    def joint_log_likelihood(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        out = np.empty((X.shape[0], len(self.classes_)))
+        for start in range(0, X.shape[0], self._BLOCK):
+            block = X[start:start + self._BLOCK, np.newaxis, :]
+            sq = np.sum(((block - self.theta) ** 2) / self.var, axis=2)
+            out[start:start + self._BLOCK] = self.log_prior + (self.log_norm - 0.5 * sq)
+        return out
+
+    def predict_proba(self, X):
+        jll = self.joint_log_likelihood(X)
+        jll -= jll.max(axis=1, keepdims=True)
+        proba = np.exp(jll)
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.joint_log_likelihood(X), axis=1)]
+
+    def _sparse_terms(self):
+        # For 0/1 inputs sum((x - theta)**2 / var) splits into a per-class
+        # baseline (every feature 0) plus a per-feature delta for each 1.
+        terms = self.__dict__.get('_sparse')
+        if terms is None:
+            inv_var = 1.0 / self.var
+            baseline = self.log_prior + self.log_norm - 0.5 * np.sum(self.theta ** 2 * inv_var, axis=1)
+            delta = -0.5 * (1.0 - 2.0 * self.theta) * inv_var
+            terms = self._sparse = (baseline, np.ascontiguousarray(delta.T))
+        return terms
+
+    def sparse_joint_log_likelihood(self, X):
+        """``joint_log_likelihood`` for 0/1 rows, touching only the active features.
+
+        Each row costs one gather of ``n_active x n_classes`` precomputed deltas
+        instead of ``n_features x n_classes`` squared distances. ``X`` may be a
+        dense 0/1 matrix or a scipy sparse matrix. Agrees with the dense path
+        to floating point rounding (not bit-identical).
+        """
+        baseline, delta = self._sparse_terms()
+        if hasattr(X, 'tocsr'):
+            X = X.tocsr()
+            rows = np.repeat(np.arange(X.shape[0]), np.diff(X.indptr))
+            cols = X.indices
+        else:
+            rows, cols = np.nonzero(np.asarray(X))
+        out = np.tile(baseline, (X.shape[0], 1))
+        if len(cols):
+            # rows come out sorted, so each row's deltas form one contiguous run
+            counts = np.bincount(rows, minlength=X.shape[0])
+            present = np.flatnonzero(counts)
+            starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+            out[present] += np.add.reduceat(delta[cols], starts, axis=0)
+        return out
+
+    def sparse_predict_proba(self, X):
+        jll = self.sparse_joint_log_likelihood(X)
+        jll -= jll.max(axis=1, keepdims=True)
+        proba = np.exp(jll)
+        proba /= proba.sum(axis=1, keepdims=True)
+        return proba
+
+
+def _entropy(counts):
+    """Entropy (nats) of integer class counts along the last axis; 0 for empty rows."""
+    # log(max(c, 1)) makes the 0 * log(0) terms vanish without masking
+    total = np.maximum(counts.sum(axis=-1), 1.0)
+    return np.log(total) - (counts * np.log(np.maximum(counts, 1.0))).sum(axis=-1) / total
+
+
+class CooccurrenceIndex(_ArrayState):
+    """Symptom co-occurrence and symptom -> disease indexes over the training rows.
+
+    ``profiles`` holds every distinct (symptom row, disease) pair of the
+    training data once, with its disease and row count. ``cooccurrence[i, j]``
+    counts training rows having symptoms ``i`` and ``j``, and
+    ``disease_symptoms[d, i]`` rows of disease ``d`` with symptom ``i``. Counts
+    use the smallest unsigned dtype that holds them. The index is built with
+    the models and stored in the artifact.
+    """
+
+    _ARRAYS = ('profiles', 'profile_disease', 'profile_count', 'cooccurrence', 'disease_symptoms')
+
+    def __init__(self, X, y, n_diseases):
+        X = np.asarray(X, dtype=np.uint8)
+        y = np.asarray(y, dtype=np.int64)
+        rows, counts = np.unique(np.column_stack([X, y]), axis=0, return_counts=True)
+        count_dtype = np.min_scalar_type(len(X))
+        self.profiles = np.ascontiguousarray(rows[:, :-1], dtype=np.uint8)
+        self.profile_disease = rows[:, -1].astype(np.min_scalar_type(max(n_diseases - 1, 0)))
+        self.profile_count = counts.astype(count_dtype)
+        X64 = X.astype(np.int64)
+        self.cooccurrence = (X64.T @ X64).astype(count_dtype)
+        disease_symptoms = np.zeros((n_diseases, X.shape[1]), dtype=np.int64)
+        np.add.at(disease_symptoms, y, X64)
+        self.disease_symptoms = disease_symptoms.astype(count_dtype)
+
+    def _nonzero(self):
+        nonzero = self.__dict__.get('_nonzero_cache')
+        if nonzero is None:
+            nonzero = self._nonzero_cache = np.nonzero(self.profiles)
+        return nonzero
+
+    def suggest(self, cols, k=5):
+        """Rank the next symptoms to ask about, given the selected symptom columns.
+
+        Returns ``(next, diseases, exact)``: up to ``k`` ``(column, score)``
+        pairs best first, disease ids best supported first, and whether some
+        training profile has every selected symptom. In that case ``score`` is
+        the expected information gain (nats) about the disease among those
+        profiles, ties going to the symptoms seen most often with the
+        selection, and ``diseases`` are the diseases of those profiles.
+        Otherwise ``score`` is the co-occurrence count with the selection and
+        ``diseases`` share the most selected symptoms.
+        """
+        cols = np.asarray(cols, dtype=np.intp)
+        n_diseases, n_symptoms = self.disease_symptoms.shape
+        match = self.profiles[:, cols].all(axis=1)
+        exact = bool(match.any())
+        if exact:
+            # weighted (symptom, disease) counts over the matching profiles,
+            # summed over the nonzero entries only
+            profile, symptom = self._nonzero()
+            keep = match[profile]
+            profile, symptom = profile[keep], symptom[keep]
+            disease = self.profile_disease.astype(np.intp)
+            with_symptom = np.bincount(
+                symptom * n_diseases + disease[profile], weights=self.profile_count[profile],
+                minlength=n_symptoms * n_diseases).reshape(n_symptoms, n_diseases)
+            totals = np.bincount(disease[match], weights=self.profile_count[match],
+                                 minlength=n_diseases)
+            without = totals - with_symptom
+            present = with_symptom.sum(axis=1)
+            n = totals.sum()
+            score = _entropy(totals) - (present * _entropy(with_symptom)
+                                        + (n - present) * _entropy(without)) / n
+            support = totals
+        else:
+            # no training row has the whole selection: fall back to pairwise counts
+            present = score = self.cooccurrence[cols].sum(axis=0, dtype=np.float64)
+            overlap = (self.disease_symptoms[:, cols] > 0).sum(axis=1)
+            support = np.where(overlap == overlap.max(),
+                               self.disease_symptoms[:, cols].sum(axis=1, dtype=np.float64), 0.0)
+        candidates = present > 0
+        candidates[cols] = False
+        order = np.lexsort((-present, -score))
+        ranked = [(int(c), float(score[c])) for c in order if candidates[c]][:k]
+        diseases = [int(d) for d in np.argsort(-support, kind='stable') if support[d] > 0]
+        return ranked, diseases, exact
+
+
+def _pack_rows(X):
+    """Bit-pack 0/1 rows into little-endian uint64 words (bit ``i`` = column ``i``)."""
+    # packbits only takes integer or bool input; float 0/1 matrices are valid too
+    packed = np.packbits(np.asarray(X) != 0, axis=1, bitorder='little')
+    words = np.zeros((packed.shape[0], -(-packed.shape[1] // 8) * 8), dtype=np.uint8)
+    words[:, :packed.shape[1]] = packed
+    return words.view('<u8')
+
+
+# odd multipliers folding a profile's words into one 64-bit hash
+_HASH_MULTIPLIERS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                              0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD], dtype=np.uint64)
+
+
+def _hash_words(words):
+    h = np.zeros(words.shape[0], dtype=np.uint64)
+    for i in range(words.shape[1]):
+        h ^= words[:, i] * _HASH_MULTIPLIERS[i % len(_HASH_MULTIPLIERS)]
+    return h
+
+
+class ExactMatchIndex(_ArrayState):
+    """Label distribution of every distinct training symptom profile.
+
+    ``keys`` holds each profile bit-packed into uint64 words and
+    ``distribution`` its training row count per class; the prediction for a
+    profile is its most frequent class. ``label`` answers one
+    ``symptom_bitset`` with a dict lookup, ``lookup`` a whole 0/1 matrix with
+    a vectorized probe of an open-addressing hash table.
+    """
+
+    _ARRAYS = ('keys', 'distribution')
+
+    def __init__(self, X, y, n_classes):
+        keys, inverse = np.unique(_pack_rows(X), axis=0, return_inverse=True)
+        distribution = np.zeros((len(keys), n_classes), dtype=np.int64)
+        np.add.at(distribution, (inverse.reshape(-1), np.asarray(y, dtype=np.intp)), 1)
+        self.keys = keys
+        self.distribution = distribution.astype(np.min_scalar_type(len(inverse)))
+
+    def _tables(self):
+        tables = self.__dict__.get('_table_cache')
+        if tables is None:
+            labels = np.argmax(self.distribution, axis=1)
+            by_bits = {int.from_bytes(key.tobytes(), 'little'): int(label)
+                       for key, label in zip(self.keys, labels)}
+            # open-addressing table at most 1/4 full, slot = top bits of the hash
+            hashes = _hash_words(self.keys)
+            bits = max(4, (4 * len(hashes) - 1).bit_length())
+            table = np.full(1 << bits, -1, dtype=np.intp)
+            shift = np.uint64(64 - bits)
+            depth = 1
+            for i, slot in enumerate((hashes >> shift).tolist()):
+                probe = 0
+                while table[(slot + probe) % len(table)] >= 0:
+                    probe += 1
+                table[(slot + probe) % len(table)] = i
+                depth = max(depth, probe + 1)
+            tables = self._table_cache = (labels, by_bits, hashes, table, shift, depth)
+        return tables
+
+    def label(self, bits):
+        """Return the class of the profile with this ``symptom_bitset``, or -1."""
+        return self._tables()[1].get(bits, -1)
+
+    def lookup(self, X):
+        """Return the class of each row's matching profile, -1 where there is none."""
+        labels, _, hashes, table, shift, depth = self._tables()
+        words = _pack_rows(X)
+        out = np.full(len(words), -1, dtype=np.intp)
+        if words.shape[1] != self.keys.shape[1]:
+            return out
+        h = _hash_words(words)
+        slot = (h >> shift).astype(np.intp)
+        for probe in range(depth):
+            idx = table[(slot + probe) & (len(table) - 1)]
+            hit = np.flatnonzero((idx >= 0) & (out < 0))
+            hit = hit[hashes[idx[hit]] == h[hit]]
+            if len(hit):
+                # equal hashes only narrow the search; a match needs every word equal
+                hit = hit[(self.keys[idx[hit]] == words[hit]).all(axis=1)]
+                out[hit] = labels[idx[hit]]
+        return out
+
+
+# indexes stored next to the models in the artifact and the compiled arrays
+_INDEXES = {'cooccurrence': CooccurrenceIndex, 'exact_match': ExactMatchIndex}
+
+
+def compile_models(version=None):
+    """Return the compiled engine models of a bundle, compiling them on first use."""
+    return REGISTRY.get(version).compiled()
+
+
+def compiled_path(version=None):
+    """Return the directory holding the compiled arrays for ``version``."""
+    return os.path.join(MODEL_DIR, f'pep-{version or default_version()}.compiled')
+
+
+def export_compiled(path=None, version=None):
+    """Write the compiled engine arrays as one ``.npy`` file each and return the directory.
+
+    Unlike the joblib artifact, these files can be memory-mapped directly, so
+    every worker process that loads them shares one copy in the page cache.
+    ``version`` exports a registered bundle other than the active one.
+    """
+    bundle = REGISTRY.get(version)
+    compiled = bundle.compiled()
+    path = path or compiled_path(bundle.version)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(tmp_path, exist_ok=True)
+    meta = {'format': _ARTIFACT_FORMAT, 'version': bundle.version,
+            'symptoms': list(bundle.symptoms), 'disease': list(bundle.disease), 'models': {}}
+    if bundle.feature_map is not None:
+        meta['feature_map'] = [int(c) for c in bundle.feature_map]
+    for algo, model in compiled.items():
+        arrays = model.to_arrays()
+        meta['models'][algo] = {'kind': type(model).__name__, 'arrays': sorted(arrays)}
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_path, f'{algo}.{name}.npy'), np.ascontiguousarray(arr))
+    for index_name in _INDEXES:
+        index = getattr(bundle, index_name)()
+        if index is None:
+            continue
+        arrays = index.to_arrays()
+        meta[index_name] = sorted(arrays)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp_path, f'{index_name}.{name}.npy'), np.ascontiguousarray(arr))
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh)
+    if os.path.isdir(path):
+        import shutil
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_compiled_models(path=None):
+    """Install the compiled engine from memory-mapped arrays; return the version.
+
+    Only NumPy is needed: the sklearn estimators are not unpickled (they are
+    loaded on demand if ``engine='sklearn'`` is used later). When ``path`` is
+    not given, the arrays for ``default_version()`` are used and exported
+    first if missing (from that version, even if another one is active).
+    """
+    if path is None:
+        path = compiled_path()
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            bundle = REGISTRY.load(activate=False)
+            export_compiled(path, version=bundle.version)
+    start = time.perf_counter()
+    with open(os.path.join(path, 'meta.json')) as fh:
+        meta = json.load(fh)
+    if meta.get('format') != _ARTIFACT_FORMAT:
+        raise ValueError(f'{path}: compiled arrays have format {meta.get("format")}, '
+                         f'expected {_ARTIFACT_FORMAT}')
+    kinds = {'CompiledForest': CompiledForest, 'CompiledGNB': CompiledGNB}
+    compiled = {}
+    for algo, spec in meta['models'].items():
+        arrays = {name: np.load(os.path.join(path, f'{algo}.{name}.npy'), mmap_mode='r')
+                  for name in spec['arrays']}
+        compiled[algo] = kinds[spec['kind']].from_arrays(arrays)
+    cache = {'models': compiled}
+    for index_name, cls in _INDEXES.items():
+        if index_name in meta:
+            cache[index_name] = cls.from_arrays({
+                name: np.load(os.path.join(path, f'{index_name}.{name}.npy'), mmap_mode='r')
+                for name in meta[index_name]})
+    feature_map = meta.get('feature_map')
+    bundle = ModelBundle(meta['version'], None, None, None, tuple(meta['symptoms']),
+                         tuple(meta['disease']),
+                         feature_map=None if feature_map is None else tuple(feature_map),
+                         _compiled=cache)
+    REGISTRY.install(bundle)
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.duration('compiled_load', time.perf_counter() - start)
+    return bundle.version
+
+
+def _prefix_accuracies(compiled, X, y, weights=None):
+    """Accuracy of the forest made of the first k trees, for every k."""
+    leaves = compiled.apply(X)
+    votes = np.cumsum(compiled.leaf_proba[leaves], axis=0)
+    correct = compiled.classes_[np.argmax(votes, axis=2)] == y
+    return np.average(correct, axis=1, weights=weights)
+
+
+def _select_features(X, importances):
+    """Return ``feature_map`` and the dropped symptom columns by reason.
+
+    Columns that are constant or that no fitted tree splits on are dropped;
+    a column identical to an earlier one is merged into it.
+    """
+    constant = X.min(axis=0) == X.max(axis=0)
+    unused = np.all(np.asarray(importances) == 0, axis=0)
+    feature_map = np.full(X.shape[1], -1, dtype=np.intp)
+    dropped = {'constant': [], 'unused': [], 'duplicate': []}
+    seen = {}
+    for col in range(X.shape[1]):
+        if constant[col]:
+            dropped['constant'].append(col)
+        elif unused[col]:
+            dropped['unused'].append(col)
+        else:
+            key = X[:, col].tobytes()
+            if key in seen:
+                feature_map[col] = feature_map[seen[key]]
+                dropped['duplicate'].append(col)
+            else:
+                seen[key] = col
+                feature_map[col] = len(seen) - 1
+    return feature_map, dropped
+
+
+def compact_models(version=None, min_trees=10, verbose=False):
+    """Derive a smaller, faster ``ModelBundle`` from a trained one.
+
+    Symptom columns that are constant in the training data (e.g. the all-zero
+    ``fluid_overload``) or that no tree or forest split uses are dropped, and
+    columns identical to another one are merged into it; the models are then
+    refitted on the remaining features. The forest keeps the smallest prefix
+    of its trees (at least ``min_trees``) that scores as well on Testing.csv,
+    and on the training data, as all of them. Both are near 100% here, so the
+    cut is aggressive; check unseen symptom profiles with ``evaluate_models``
+    before relying on a very small forest. The bundle's compiled engine
+    stores feature ids and leaf classes in the smallest integer dtypes and
+    drops the probability table when every leaf is pure.
+
+    Inputs are remapped onto the kept features (``feature_map``), so
+    ``predict_symptoms``/``predict_batch`` accept the same symptom names and
+    matrices as before. The bundle is returned, not installed; its payload
+    records the reductions under ``compaction`` and the source version under
+    ``base_version``. Once saved (``python PEP.py compact``), serve it with
+    ``build_models(version=...)`` or ``PEP_MODEL_VERSION``.
+    """
+    import pickle
+    from sklearn.metrics import accuracy_score
+
+    if min_trees < 0:
+        raise ValueError(f'min_trees must be at least 0, got {min_trees}')
+    base = _bundle(version, engine='sklearn')
+    if base.feature_map is not None:
+        raise ValueError(f'model version {base.version!r} is already compacted')
+    config = TrainConfig(**base.payload['config']) if base.payload else DEFAULT_TRAIN_CONFIG
+    data = load_training_data()
+    X_train, y_train = np.asarray(data['X_train']), np.asarray(data['y_train'])
+    X_test, y_test = np.asarray(data['X_test']), np.asarray(data['y_test'])
+
+    feature_map, dropped = _select_features(
+        X_train, [base.tree.feature_importances_, base.forest.feature_importances_])
+    bundle = ModelBundle('compacting', None, None, None, base.symptoms, base.disease,
+                         feature_map=tuple(int(c) for c in feature_map))
+    Xc_train, Xc_test = bundle.project(X_train), bundle.project(X_test)
+
+    models = {name: _eval_estimator(name, {}, config.random_state) for name in ALGORITHMS}
+    models['random'].set_params(n_estimators=config.n_estimators, n_jobs=config.n_jobs)
+    X_fit, y_fit, sample_weight = _fit_rows(Xc_train, y_train, config.dedupe)
+    for model in models.values():
+        model.fit(X_fit, y_fit, sample_weight=sample_weight)
+    forest = models['random']
+    forest.n_jobs = None
+
+    # smallest prefix of trees matching the full forest; the training rows
+    # are mostly repeats, so score each distinct row once with its count
+    compiled = CompiledForest.from_sklearn(forest)
+    unique, first, counts = np.unique(Xc_train, axis=0, return_index=True, return_counts=True)
+    test_acc = _prefix_accuracies(compiled, Xc_test, y_test)
+    train_acc = _prefix_accuracies(compiled, unique, y_train[first], counts)
+    good = (test_acc >= test_acc[-1]) & (train_acc >= train_acc[-1])
+    good[:min(max(min_trees, 1), len(good)) - 1] = False
+    n_trees = int(np.argmax(good)) + 1
+    forest.estimators_ = forest.estimators_[:n_trees]
+    forest.n_estimators = n_trees
+    models['random'] = forest
+
+    compiled = {
+        'tree': CompiledForest.from_sklearn(models['tree']).compact(),
+        'random': CompiledForest.from_sklearn(forest).compact(),
+        'gnb': CompiledGNB(models['gnb']),
+    }
+    before = {name: len(pickle.dumps(m, protocol=pickle.HIGHEST_PROTOCOL))
+              for name, m in base.models().items()}
+    after = {name: len(pickle.dumps(m, protocol=pickle.HIGHEST_PROTOCOL))
+             for name, m in models.items()}
+    symptoms = base.symptoms
+    report = {
+        'features': {'before': len(symptoms), 'after': bundle.n_features},
+        'dropped': {reason: [symptoms[c] for c in cols] for reason, cols in dropped.items()},
+        'merged_into': {symptoms[c]: symptoms[bundle._projection[0][feature_map[c]]]
+                        for c in dropped['duplicate']},
+        'trees': {'before': len(base.forest.estimators_), 'after': n_trees},
+        'sklearn_bytes': {'before': before, 'after': after},
+        'compiled_bytes': {
+            'before': {name: m.nbytes for name, m in base.compiled().items()},
+            'after': {name: m.nbytes for name, m in compiled.items()},
+        },
+        'test_accuracy': {
+            'before': {name: accuracy_score(y_test, m.predict(X_test))
+                       for name, m in base.models().items()},
+            'after': {name: accuracy_score(y_test, m.predict(Xc_test))
+                      for name, m in models.items()},
+        },
+    }
+    payload = dict(
+        base.payload or {},
+        version=f'{base.version}-compact',
+        tree=models['tree'],
+        forest=forest,
+        gnb=models['gnb'],
+        symptoms=list(symptoms),
+        disease=list(base.disease),
+        feature_map=[int(c) for c in feature_map],
+        exact_match=None,
+        scores={'train': models['tree'].score(Xc_train, y_train),
+                'test': report['test_accuracy']['after']['tree']},
+        compaction=report,
+        base_version=base.version,
+    )
+    if verbose:
+        print(format_compaction(report))
+    bundle = ModelBundle.from_payload(payload)
+    bundle._compiled['models'] = compiled
+    return bundle
+
 
-    input_set = set(map(str, input_symptoms))
+def format_compaction(report):
+    """Render the ``compaction`` report of ``compact_models`` as text."""
+    lines = [f'Features: {report["features"]["before"]} -> {report["features"]["after"]}',
+             f'Forest trees: {report["trees"]["before"]} -> {report["trees"]["after"]}']
+    for reason, names in report['dropped'].items():
+        if names:
+            lines.append(f'Dropped ({reason}): {", ".join(names)}')
+    lines.append(f'{"model":<8}{"sklearn KiB":>22}{"compiled KiB":>22}{"test accuracy":>18}')
+    for name in ALGORITHMS:
+        sk, co, acc = (report[key] for key in ('sklearn_bytes', 'compiled_bytes', 'test_accuracy'))
+        lines.append(f'{name:<8}{sk["before"][name] / 1024:>10.1f} -> {sk["after"][name] / 1024:>8.1f}'
+                     f'{co["before"][name] / 1024:>10.1f} -> {co["after"][name] / 1024:>8.1f}'
+                     f'{acc["before"][name]:>9.3f} -> {acc["after"][name]:.3f}')
+    return '\n'.join(lines)
 
-    # create feature vector
-    local_result = [1 if s in input_set else 0 for s in _SYMPTOMS]
-    labels = [local_result]
 
-    if algorithm == 'random':
-        pred = _MODEL_FOREST.predict(labels)
-    elif algorithm == 'gnb':
-        pred = _MODEL_GNB.predict(labels)
+ALGORITHMS = ('tree', 'random', 'gnb')
+
+
+def predict_symptoms(input_symptoms, algorithm='tree', voting='hard', weights=None,
+                     return_votes=False, use_cache=True, engine=None, version=None,
+                     exact_match=None):
+    """Return predicted disease name given an iterable of symptom strings.
+
+    ``input_symptoms`` may also be a row already produced by ``encode_symptoms``.
+    ``algorithm='auto'`` runs all three models on the same encoded row and
+    returns the ensemble winner (see ``predict_batch`` for ``voting`` and
+    ``weights``); with ``return_votes=True`` it returns ``(winner, votes)``
+    where ``votes`` maps each algorithm to its own prediction.
+    Results are memoised in the shared ``PredictionCache`` keyed by the symptom
+    bitset, the algorithm options and the model version; pass
+    ``use_cache=False`` to bypass it. ``engine='compiled'`` scores with the
+    flat NumPy copies of the models instead of sklearn (same predictions).
+    ``version`` scores with a specific registered bundle (see ``ModelRegistry``)
+    instead of the active one. An input identical to a training profile is
+    answered with that profile's most frequent disease without running a model
+    (see ``ExactMatchIndex``); ``exact_match=False`` (or ``PEP_EXACT_MATCH=0``)
+    turns this off, and it never applies with ``return_votes=True``. The
+    function will build models on first call (lazily).
+    """
+    metrics = _METRICS
+    if metrics is not None:
+        start = time.perf_counter_ns()
+    # one bundle for the whole call, even if another thread swaps models meanwhile
+    bundle = _bundle(version, engine)
+    if metrics is not None:
+        lap = time.perf_counter_ns()
+
+    if isinstance(input_symptoms, np.ndarray):
+        row = input_symptoms
+        bits = sum(1 << int(c) for c in np.flatnonzero(row))
     else:
-        pred = _MODEL_TREE.predict(labels)
+        row = None
+        bits = _symptom_bits(input_symptoms, bundle.symptom_index)
+    if metrics is not None:
+        lap = _lap(metrics, 'encode', lap)
+
+    index = _exact_index(bundle, exact_match, return_votes)
+    if index is not None:
+        label = index.label(bits)
+        if label >= 0:
+            if metrics is not None:
+                metrics.observe('total.predict_symptoms', time.perf_counter_ns() - start)
+                metrics.count('calls.predict_symptoms')
+                metrics.count('rows.exact')
+            return bundle.disease[label]
+
+    key = None
+    result = PredictionCache._MISSING
+    if use_cache:
+        if algorithm == 'auto':
+            key = (bits, algorithm, voting, tuple(_vote_weights(weights).values()), bundle.version)
+        else:
+            key = (bits, algorithm, bundle.version)
+        result = _PREDICTION_CACHE.get(key)
+        if metrics is not None:
+            _lap(metrics, 'cache', lap)
+
+    if result is PredictionCache._MISSING:
+        if row is None:
+            row = _feature_row(bundle, bits)
+        elif bundle.feature_map is not None:
+            row = bundle.project(row.reshape(1, -1))[0]
+        if algorithm == 'auto':
+            winner, votes = _vote(bundle, row.reshape(1, -1), voting, weights, engine)
+            result = (_disease_names(bundle, winner)[0],
+                      {a: _disease_names(bundle, v)[0] for a, v in votes.items()})
+        else:
+            result = _predict_one(bundle, row, algorithm, engine)
+        if key is not None:
+            _PREDICTION_CACHE.put(key, result)
+
+    if metrics is not None:
+        metrics.observe('total.predict_symptoms', time.perf_counter_ns() - start)
+        metrics.count('calls.predict_symptoms')
+    if algorithm == 'auto':
+        pred, votes = result
+        return (pred, dict(votes)) if return_votes else pred
+    return result
+
+
+def _exact_index(bundle, exact_match, return_votes=False):
+    """Return the bundle's ``ExactMatchIndex`` when lookups apply, else None."""
+    if return_votes or not (EXACT_MATCH if exact_match is None else exact_match):
+        return None
+    return bundle.exact_match()
+
+
+def _feature_row(bundle, bits):
+    """Expand a symptom bitset into a row of the bundle's model features."""
+    row = np.zeros(bundle.n_features, dtype=np.uint8)
+    if bundle.feature_map is None:
+        return bitset_to_row(bits, row)
+    fmap = bundle.feature_map
+    col = 0
+    while bits:
+        if bits & 1 and fmap[col] >= 0:
+            row[fmap[col]] = 1
+        bits >>= 1
+        col += 1
+    return row
+
+
+def _lap(metrics, stage, since):
+    """Record the time elapsed since ``since`` (ns) under ``stage``; return now."""
+    now = time.perf_counter_ns()
+    metrics.observe(stage, now - since)
+    return now
+
+
+def _timed_predict(model, method, X, algorithm):
+    """Call ``model.<method>(X)``, timing it per algorithm when instrumentation is on."""
+    metrics = _METRICS
+    if metrics is None:
+        return getattr(model, method)(X)
+    start = time.perf_counter_ns()
+    out = getattr(model, method)(X)
+    _lap(metrics, f'model.{algorithm}', start)
+    metrics.count(f'rows.{algorithm}', X.shape[0])
+    return out
+
+
+def _predict_one(bundle, row, algorithm, engine=None):
+    algorithm = algorithm if algorithm in ALGORITHMS else 'tree'
+    pred = _timed_predict(_select_model(bundle, algorithm, engine), 'predict',
+                          row.reshape(1, -1), algorithm)
 
     try:
         idx = int(pred[0])
     except Exception:
         return None
 
-    if 0 <= idx < len(_DISEASE):
-        return _DISEASE[idx]
+    if 0 <= idx < len(bundle.disease):
+        return bundle.disease[idx]
     return None
 
 
-if __name__ == '__main__':
-    # if run as script, build models with verbose output and run a demo prediction
-    build_models(verbose=True)
-    sample = {'itching','skin_rash','nodal_skin_eruptions'}
-    print('Sample prediction ->', predict_symptoms(sample))
-                           
+def _engine_models(bundle, engine=None):
+    """Return the bundle's ``{algorithm: model}`` mapping for ``engine``."""
+    engine = engine or DEFAULT_ENGINE
+    if engine == 'compiled':
+        return bundle.compiled()
+    if engine != 'sklearn':
+        raise ValueError(f'engine must be one of {ENGINES}, got {engine!r}')
+    return bundle.models()
+
+
+def _select_model(bundle, algorithm, engine=None):
+    models = _engine_models(bundle, engine)
+    return models[algorithm if algorithm in ALGORITHMS else 'tree']
+
+
+def _disease_names(bundle, pred):
+    """Map an array of class indices to disease names (None when out of range)."""
+    pred = np.array(pred, dtype=np.intp)
+    pred[(pred < 0) | (pred >= len(bundle.disease))] = len(bundle.disease)
+    names = np.asarray(bundle.disease + (None,), dtype=object)
+    return names[pred].tolist()
+
+
+def _vote_weights(weights):
+    if weights is None:
+        return dict.fromkeys(ALGORITHMS, 1.0)
+    if isinstance(weights, dict):
+        unknown = set(weights) - set(ALGORITHMS)
+        if unknown:
+            raise ValueError(f'unknown algorithm(s) in weights: {sorted(unknown)}')
+        return {a: float(weights.get(a, 1.0)) for a in ALGORITHMS}
+    weights = list(weights)
+    if len(weights) != len(ALGORITHMS):
+        raise ValueError(f'expected {len(ALGORITHMS)} weights, got {len(weights)}')
+    return dict(zip(ALGORITHMS, map(float, weights)))
+
+
+def _vote(bundle, X, voting='hard', weights=None, engine=None):
+    """Run every model once on ``X`` and combine them.
+
+    Returns ``(winner, votes)``: an array of winning class indices and a dict
+    of per-algorithm class indices. Hard voting sums the weights of the models
+    agreeing on a class and breaks ties in favour of the decision tree; soft
+    voting averages ``predict_proba`` with the same weights.
+    """
+    if voting not in ('hard', 'soft'):
+        raise ValueError(f"voting must be 'hard' or 'soft', got {voting!r}")
+    w = _vote_weights(weights)
+    n = X.shape[0]
+    rows = np.arange(n)
+    scores = np.zeros((n, len(bundle.disease)))
+    votes = {}
+    models = _engine_models(bundle, engine)
+    for algo in ALGORITHMS:
+        model = models[algo]
+        if voting == 'soft':
+            # one predict_proba per model; its argmax is the model's own vote
+            proba = _timed_predict(model, 'predict_proba', X, algo)
+            classes = np.asarray(model.classes_, dtype=np.intp)
+            votes[algo] = classes[np.argmax(proba, axis=1)]
+            scores[:, classes] += w[algo] * proba
+        else:
+            votes[algo] = np.asarray(_timed_predict(model, 'predict', X, algo), dtype=np.intp)
+            scores[rows, votes[algo]] += w[algo]
+
+    metrics = _METRICS
+    if metrics is not None:
+        start = time.perf_counter_ns()
+    winner = np.argmax(scores, axis=1)
+    if voting == 'hard':
+        best = scores[rows, winner]
+        tree_vote = votes['tree']
+        tied = (scores == best[:, None]).sum(axis=1) > 1
+        use_tree = tied & (scores[rows, tree_vote] == best)
+        winner[use_tree] = tree_vote[use_tree]
+    if metrics is not None:
+        _lap(metrics, 'vote', start)
+    return winner, votes
+
+
+def _encode_records(records, bundle):
+    """Encode an iterable of symptom sets into one preallocated uint8 matrix.
+
+    A 2-D array (or scipy sparse matrix) that is already 0/1 encoded in the
+    bundle's symptom column order is passed through unchanged. A DataFrame in
+    the ``training.csv`` layout has its symptom columns picked by name (other
+    columns are ignored). For compacted bundles the result has the model
+    feature columns instead.
+    """
+    n_symptoms = len(bundle.symptoms)
+    if hasattr(records, 'columns') and hasattr(records, 'to_numpy'):
+        # iterating a DataFrame would yield its column names, not its rows
+        frame = records.set_axis([_clean_column(str(c)) for c in records.columns], axis=1)
+        missing = sorted(set(bundle.symptoms) - set(frame.columns))
+        if missing:
+            raise ValueError(f'missing symptom column(s): {", ".join(missing)}')
+        records = frame[list(bundle.symptoms)].to_numpy(dtype=np.uint8)
+    if hasattr(records, 'toarray'):
+        records = records.toarray()
+    if isinstance(records, np.ndarray) and records.ndim == 2:
+        if records.shape[1] != n_symptoms:
+            raise ValueError(f'expected {n_symptoms} symptom columns, got {records.shape[1]}')
+        return bundle.project(records)
+
+    if not isinstance(records, (list, tuple)):
+        records = list(records)
+    X = np.zeros((len(records), bundle.n_features), dtype=np.uint8)
+    for row, rec in enumerate(records):
+        _encode_row(rec, bundle.feature_index, out=X[row], known=bundle.symptom_index)
+    return X
+
+
+def predict_batch(records, algorithm='tree', voting='hard', weights=None,
+                  return_votes=False, engine=None, version=None, exact_match=None):
+    """Return a list of predicted disease names, one per record.
+
+    ``records`` is an iterable of symptom collections, an already-encoded
+    0/1 matrix with one column per model symptom, or a DataFrame with those
+    symptom columns (matched by name). The whole batch is
+    encoded into a single matrix and scored with one model call.
+
+    ``algorithm='auto'`` scores the shared matrix with all three models and
+    combines them by ``voting='hard'`` (weighted majority, ties go to the
+    decision tree) or ``voting='soft'`` (weighted mean of ``predict_proba``).
+    ``weights`` is a dict keyed by algorithm or a sequence in ``ALGORITHMS``
+    order. With ``return_votes=True`` the result is ``(winners, votes)`` where
+    ``votes`` maps each algorithm to its list of predictions.
+
+    ``engine`` selects the inference backend (``'sklearn'`` or ``'compiled'``;
+    default ``DEFAULT_ENGINE``, set from ``PEP_ENGINE``). ``version`` picks a
+    registered model bundle other than the active one, e.g. for A/B scoring.
+    ``exact_match`` works as in ``predict_symptoms``: rows matching a training
+    profile are answered from the index and only the rest reach the models.
+    """
+    metrics = _METRICS
+    if metrics is not None:
+        start = time.perf_counter_ns()
+    bundle = _bundle(version, engine)
+    if metrics is not None:
+        lap = time.perf_counter_ns()
+    X = _encode_records(records, bundle)
+    if metrics is not None:
+        lap = _lap(metrics, 'encode', lap)
+
+    pred = None
+    index = _exact_index(bundle, exact_match, return_votes) if X.shape[0] else None
+    if index is not None:
+        pred = index.lookup(X)
+        todo = np.flatnonzero(pred < 0)
+        if metrics is not None:
+            _lap(metrics, 'exact', lap)
+            metrics.count('rows.exact', X.shape[0] - len(todo))
+        if len(todo) < X.shape[0]:
+            X = X[todo]
+
+    votes = None
+    if X.shape[0] == 0:
+        labels = np.empty(0, dtype=np.intp)
+    elif algorithm == 'auto':
+        labels, votes = _vote(bundle, X, voting, weights, engine)
+    else:
+        algorithm = algorithm if algorithm in ALGORITHMS else 'tree'
+        model = _select_model(bundle, algorithm, engine)
+        labels = _timed_predict(model, 'predict', X, algorithm)
+    if pred is not None:
+        pred[todo] = labels
+        labels = pred
+    result = _disease_names(bundle, labels)
+    if algorithm == 'auto' and return_votes:
+        votes = votes or dict.fromkeys(ALGORITHMS, ())
+        result = result, {a: _disease_names(bundle, v) for a, v in votes.items()}
+
+    if metrics is not None:
+        metrics.observe('total.predict_batch', time.perf_counter_ns() - start)
+        metrics.count('calls.predict_batch')
+    return result
+
+
+def _proba_matrix(bundle, X, algorithm, weights=None, engine=None):
+    """Return (n, n_diseases) class probabilities for ``X``.
+
+    ``algorithm='auto'`` is the weighted mean of all three models. GaussianNB
+    always goes through ``CompiledGNB.sparse_predict_proba`` since inputs
+    are 0/1 and only a handful of the features are set.
+    """
+    algos = ALGORITHMS if algorithm == 'auto' else (algorithm,)
+    w = _vote_weights(weights)
+    total = sum(w[a] for a in algos)
+    scores = np.zeros((X.shape[0], len(bundle.disease)))
+    models = _engine_models(bundle, engine)
+    for algo in algos:
+        model = models[algo]
+        if algo == 'gnb':
+            if not isinstance(model, CompiledGNB):
+                model = bundle.compiled()['gnb']
+            proba = _timed_predict(model, 'sparse_predict_proba', X, algo)
+        else:
+            proba = _timed_predict(model, 'predict_proba', X, algo)
+        classes = np.asarray(model.classes_, dtype=np.intp)
+        scores[:, classes] += (w[algo] / total) * proba
+    return scores
+
 
-                  
+def predict_topk_batch(records, k=5, algorithm='auto', weights=None, engine=None, version=None):
+    """Return the ``k`` most probable diseases for each record.
+
+    Each result is a list of ``(disease, probability)`` pairs sorted from most
+    to least probable (ties keep disease order). Probabilities come from one
+    ``predict_proba`` call per model over the whole batch; ``algorithm='auto'``
+    averages the three models with ``weights`` as in ``predict_batch``.
+    """
+    if algorithm not in ALGORITHMS + ('auto',):
+        raise ValueError(f'algorithm must be one of {ALGORITHMS + ("auto",)}, got {algorithm!r}')
+    if k < 1:
+        raise ValueError(f'k must be at least 1, got {k}')
+
+    metrics = _METRICS
+    if metrics is not None:
+        start = time.perf_counter_ns()
+    bundle = _bundle(version, engine)
+    if metrics is not None:
+        lap = time.perf_counter_ns()
+    X = _encode_records(records, bundle)
+    if metrics is not None:
+        _lap(metrics, 'encode', lap)
+        metrics.count('calls.predict_topk')
+    if X.shape[0] == 0:
+        return []
+    scores = _proba_matrix(bundle, X, algorithm, weights, engine)
+    k = min(k, scores.shape[1])
+    order = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    top = np.take_along_axis(scores, order, axis=1)
+    names = np.asarray(bundle.disease, dtype=object)[order]
+    result = [list(zip(n, map(float, s))) for n, s in zip(names.tolist(), top)]
+    if metrics is not None:
+        metrics.observe('total.predict_topk', time.perf_counter_ns() - start)
+    return result
+
+
+def predict_topk(input_symptoms, k=5, algorithm='auto', weights=None, engine=None,
+                 version=None):
+    """Return the ``k`` most probable ``(disease, probability)`` pairs for one record."""
+    return predict_topk_batch([input_symptoms], k=k, algorithm=algorithm, weights=weights,
+                              engine=engine, version=version)[0]
+
+
+def suggest_symptoms(selected, k=5, version=None):
+    """Suggest which symptoms to ask about next and list the diseases still possible.
+
+    Uses the ``CooccurrenceIndex`` stored with the models, so no model runs.
+    Returns a dict with ``next``, up to ``k`` ``(symptom, score)`` pairs best
+    first; ``diseases``, the disease names consistent with the selection, best
+    supported first; and ``exact``. ``exact`` is True when some training
+    profile contains every selected symptom. Then the diseases are those of
+    the matching profiles and the score is the expected information gain
+    about the disease. Otherwise the symptoms are ranked by co-occurrence
+    with the selection, and the diseases listed share the most selected
+    symptoms.
+    """
+    bundle = REGISTRY.get(version)
+    index = bundle.symptom_index
+    cols, unknown = set(), []
+    for s in _as_symptom_iterable(selected):
+        col = index.get(str(s))
+        if col is None:
+            unknown.append(str(s))
+        else:
+            cols.add(col)
+    if unknown:
+        raise UnknownSymptomError(unknown)
+    ranked, diseases, exact = bundle.cooccurrence().suggest(sorted(cols), k)
+    return {
+        'next': [(bundle.symptoms[c], score) for c, score in ranked],
+        'diseases': [bundle.disease[d] for d in diseases],
+        'exact': exact,
+    }
+
+
+def score_csv(in_path, out_path, algorithm='tree', chunksize=10000, engine=None,
+              voting='hard', progress=None, exact_match=None):
+    """Score a symptom-column CSV in fixed-size chunks and stream predictions out.
+
+    ``in_path`` uses the ``training.csv`` layout: one 0/1 column per symptom
+    (headers are normalised like ``build_models`` does, so 'spotting_ urination'
+    works) plus any other columns, which are copied to the output next to a
+    ``predicted`` column. Only one chunk is held in memory at a time.
+    ``out_path`` may be '-' for stdout. Rows/sec progress is written to
+    ``progress`` (a file object, e.g. sys.stderr) when given. ``exact_match``
+    is passed to ``predict_batch``. Returns the number of rows scored.
+    """
+    import pandas as pd
+
+    bundle = _bundle(engine=engine)
+    symptoms = list(bundle.symptoms)
+    header = [str(c) for c in pd.read_csv(in_path, nrows=0).columns]
+    cleaned = [_clean_column(c) for c in header]
+    missing = sorted(set(symptoms) - set(cleaned))
+    if missing:
+        raise ValueError(f'{in_path}: missing symptom column(s): {", ".join(missing)}')
+    wanted = set(symptoms)
+    dtypes = {raw: np.uint8 for raw, c in zip(header, cleaned) if c in wanted}
+
+    out = sys.stdout if out_path == '-' else open(out_path, 'w', newline='')
+    total = 0
+    start = time.perf_counter()
+    try:
+        for chunk in pd.read_csv(in_path, chunksize=chunksize, dtype=dtypes):
+            chunk.columns = cleaned
+            X = chunk[symptoms].to_numpy(dtype=np.uint8)
+            result = chunk[[c for c in cleaned if c not in wanted]].copy()
+            result['predicted'] = predict_batch(X, algorithm=algorithm, engine=engine,
+                                                voting=voting, version=bundle.version,
+                                                exact_match=exact_match)
+            result.to_csv(out, header=(total == 0), index=False)
+            total += len(chunk)
+            if progress is not None:
+                elapsed = time.perf_counter() - start
+                print(f'{total} rows, {total / elapsed:,.0f} rows/s', file=progress, flush=True)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return total
+
+
+# Hyperparameter grid searched by ``evaluate_models``. The 'auto' family votes
+# with the three models at their ``TrainConfig`` defaults.
+DEFAULT_EVAL_GRID = {
+    'tree': {'max_depth': [None, 8, 16], 'min_samples_leaf': [1, 2]},
+    'random': {'n_estimators': [10, 25, 50, 100], 'max_depth': [None, 12]},
+    'gnb': {'var_smoothing': [1e-9, 1e-6, 1e-3]},
+    'auto': {'voting': ['hard', 'soft'], 'weights': [(1, 1, 1), (2, 1, 1), (1, 2, 1)]},
+}
+
+
+def _eval_estimator(family, params, random_state):
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.tree import DecisionTreeClassifier
+
+    if family == 'tree':
+        return DecisionTreeClassifier(random_state=random_state, **params)
+    if family == 'random':
+        return RandomForestClassifier(random_state=random_state, **params)
+    if family == 'gnb':
+        return GaussianNB(**params)
+    raise ValueError(f'unknown model family {family!r}')
+
+
+def _cv_task(family, params, X, y, train_idx, val_idx, X_test, y_test, disease,
+             latency_rows, random_state):
+    """Fit one grid point on one fold; return its scores, timings and size."""
+    import pickle
+
+    X_train, y_train = X[train_idx], y[train_idx]
+    start = time.perf_counter()
+    if family == 'auto':
+        models = {name: _eval_estimator(name, {}, random_state) for name in ALGORITHMS}
+        for model in models.values():
+            model.fit(X_train, y_train)
+        bundle = ModelBundle('cv', models['tree'], models['random'], models['gnb'], (), disease)
+
+        def predict(A):
+            return _vote(bundle, A, params['voting'], params['weights'], 'sklearn')[0]
+    else:
+        models = {family: _eval_estimator(family, params, random_state).fit(X_train, y_train)}
+        predict = models[family].predict
+    fit_seconds = time.perf_counter() - start
+
+    latencies = []
+    for row in X[val_idx[:latency_rows]]:
+        t0 = time.perf_counter()
+        predict(row[None, :])
+        latencies.append(time.perf_counter() - t0)
+    return {
+        'accuracy': float(np.mean(predict(X[val_idx]) == y[val_idx])),
+        'test_accuracy': float(np.mean(predict(X_test) == y_test)),
+        'fit_seconds': fit_seconds,
+        'latency_s': float(np.median(latencies)),
+        'size_bytes': sum(len(pickle.dumps(m, protocol=pickle.HIGHEST_PROTOCOL))
+                          for m in models.values()),
+    }
+
+
+def _cv_splits(X, y, folds, random_state, group_duplicates=True):
+    """Return stratified ``(train_idx, val_idx)`` pairs, computed once per evaluation.
+
+    With ``group_duplicates`` identical symptom rows stay in the same fold, so
+    the many repeated profiles in training.csv cannot leak into validation.
+    """
+    from sklearn.model_selection import StratifiedKFold
+    if not group_duplicates:
+        cv = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+        return list(cv.split(X, y))
+    try:
+        from sklearn.model_selection import StratifiedGroupKFold
+        cv = StratifiedGroupKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    except ImportError:  # scikit-learn < 1.0
+        from sklearn.model_selection import GroupKFold
+        cv = GroupKFold(n_splits=folds)
+    groups = np.unique(X, axis=0, return_inverse=True)[1].reshape(-1)
+    return list(cv.split(X, y, groups))
+
+
+def evaluate_models(grid=None, folds=5, n_jobs=-1, random_state=42, latency_rows=50,
+                    group_duplicates=True, verbose=False):
+    """Cross-validate a hyperparameter grid for each model family in parallel.
+
+    ``grid`` maps a family ('tree', 'random', 'gnb' or 'auto') to a dict of
+    parameter lists (default ``DEFAULT_EVAL_GRID``). The training data is
+    encoded and split into stratified folds once; every (config, fold) pair is
+    then a joblib task over all cores (``n_jobs``) that shares the encoded
+    matrix through a memory map. Returns one dict per config, sorted by CV
+    accuracy then latency: ``family``, ``params``, ``accuracy`` (mean over
+    folds), ``accuracy_std``, ``test_accuracy`` (Testing.csv, mean over the
+    fold models), ``fit_seconds``, ``latency_s`` (median single-row predict,
+    measured inside the busy pool, so compare rows rather than absolute
+    values) and ``size_bytes`` (pickled models).
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import ParameterGrid
+
+    grid = DEFAULT_EVAL_GRID if grid is None else grid
+    data = load_training_data()
+    X, y = np.ascontiguousarray(data['X_train']), np.asarray(data['y_train'])
+    X_test, y_test = np.asarray(data['X_test']), np.asarray(data['y_test'])
+    splits = _cv_splits(X, y, folds, random_state, group_duplicates)
+    configs = [(family, params) for family, space in grid.items()
+               for params in ParameterGrid(space)]
+
+    start = time.perf_counter()
+    # max_nbytes: dump X to a shared memmap once instead of pickling it per task
+    results = Parallel(n_jobs=n_jobs, max_nbytes='64K')(
+        delayed(_cv_task)(family, params, X, y, train_idx, val_idx, X_test, y_test,
+                          tuple(data['disease']), latency_rows, random_state)
+        for family, params in configs for train_idx, val_idx in splits)
+    if verbose:
+        print(f'{len(results)} fits ({len(configs)} configs x {len(splits)} folds) '
+              f'in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+    rows = []
+    for i, (family, params) in enumerate(configs):
+        fold_results = results[i * len(splits):(i + 1) * len(splits)]
+        accuracy = [r['accuracy'] for r in fold_results]
+        rows.append({
+            'family': family,
+            'params': params,
+            'accuracy': float(np.mean(accuracy)),
+            'accuracy_std': float(np.std(accuracy)),
+            **{key: float(np.mean([r[key] for r in fold_results]))
+               for key in ('test_accuracy', 'fit_seconds', 'size_bytes')},
+            'latency_s': float(np.median([r['latency_s'] for r in fold_results])),
+        })
+    rows.sort(key=lambda r: (-r['accuracy'], r['latency_s']))
+    return rows
+
+
+def _format_params(params):
+    return ', '.join(f'{k}={v}' for k, v in sorted(params.items())) or 'defaults'
+
+
+def format_evaluation(rows, min_accuracy=None):
+    """Render ``evaluate_models`` rows as a text table.
+
+    With ``min_accuracy`` the fastest config whose CV accuracy reaches it is
+    named at the end.
+    """
+    lines = [f'{"family":<8}{"params":<38}{"cv acc":>8}{"+/-":>7}{"test":>7}'
+             f'{"fit ms":>9}{"lat us":>9}{"size KiB":>10}']
+    for r in rows:
+        lines.append(f'{r["family"]:<8}{_format_params(r["params"]):<38}'
+                     f'{r["accuracy"]:>8.4f}{r["accuracy_std"]:>7.4f}{r["test_accuracy"]:>7.3f}'
+                     f'{r["fit_seconds"] * 1e3:>9.1f}{r["latency_s"] * 1e6:>9.1f}'
+                     f'{r["size_bytes"] / 1024:>10.1f}')
+    if min_accuracy is not None:
+        eligible = [r for r in rows if r['accuracy'] >= min_accuracy]
+        if eligible:
+            best = min(eligible, key=lambda r: r['latency_s'])
+            lines.append(f'\nFastest with cv accuracy >= {min_accuracy}: {best["family"]} '
+                         f'({_format_params(best["params"])})')
+        else:
+            lines.append(f'\nNo config reaches cv accuracy {min_accuracy}')
+    return '\n'.join(lines)
+
+
+def _main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog='PEP', description='Disease prediction models')
+    sub = parser.add_subparsers(dest='command')
+    p_train = sub.add_parser('train', help='retrain from the CSVs and export the model artifact')
+    p_export = sub.add_parser('export', help='export the model artifact to a path')
+    p_export.add_argument('--out', help='artifact path (default: versioned file in MODEL_DIR)')
+    for p in (p_train, p_export):
+        p.add_argument('--n-estimators', type=int, default=DEFAULT_TRAIN_CONFIG.n_estimators)
+        p.add_argument('--seed', type=int, default=DEFAULT_TRAIN_CONFIG.random_state,
+                       help='random_state for the tree models')
+        p.add_argument('--n-jobs', type=int, default=DEFAULT_TRAIN_CONFIG.n_jobs,
+                       help='RandomForest fit parallelism (-1 = all cores)')
+        p.add_argument('--executor', choices=('thread', 'process'),
+                       default=DEFAULT_TRAIN_CONFIG.executor,
+                       help='pool used to fit the three models concurrently')
+        p.add_argument('--no-dedupe', dest='dedupe', action='store_false',
+                       help='fit on every training row instead of distinct weighted rows')
+    p_convert = sub.add_parser('convert', help='write the CSVs as a compact binary dataset')
+    p_convert.add_argument('--out-dir', help='output directory (default: DATA_DIR)')
+    p_convert.add_argument('--packed', action='store_true', help='bit-pack the feature matrix')
+    p_score = sub.add_parser('score', help='score a symptom-column CSV in chunks')
+    p_score.add_argument('input', help='CSV in the training.csv layout')
+    p_score.add_argument('--out', default='-', help="output CSV (default '-': stdout)")
+    p_score.add_argument('--algorithm', default='tree', choices=ALGORITHMS + ('auto',))
+    p_score.add_argument('--voting', default='hard', choices=('hard', 'soft'))
+    p_score.add_argument('--engine', choices=ENGINES, default=None)
+    p_score.add_argument('--chunksize', type=int, default=10000)
+    p_compact = sub.add_parser('compact', help='export pruned, smaller models')
+    p_compact.add_argument('--min-trees', type=int, default=10,
+                           help='keep at least this many forest trees')
+    p_eval = sub.add_parser('evaluate', help='cross-validate a hyperparameter grid per model')
+    p_eval.add_argument('--folds', type=int, default=5)
+    p_eval.add_argument('--n-jobs', type=int, default=-1, help='parallel fits (-1 = all cores)')
+    p_eval.add_argument('--family', action='append', choices=tuple(DEFAULT_EVAL_GRID),
+                        help='only evaluate this model family (repeatable)')
+    p_eval.add_argument('--seed', type=int, default=DEFAULT_TRAIN_CONFIG.random_state)
+    p_eval.add_argument('--min-accuracy', type=float, default=0.95,
+                        help='report the fastest config reaching this CV accuracy')
+    p_eval.add_argument('--out', help='also write the results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.command in ('train', 'export'):
+        config = TrainConfig(n_estimators=args.n_estimators, random_state=args.seed,
+                             n_jobs=args.n_jobs, executor=args.executor, dedupe=args.dedupe)
+        out = getattr(args, 'out', None)
+        print('Exported', export_models(path=out, verbose=True, config=config))
+        if model_version(config) != model_version():
+            print(f'Serve it with PEP_MODEL_VERSION={model_version(config)}')
+    elif args.command == 'convert':
+        print('Converted dataset to', convert_dataset(out_dir=args.out_dir, packed=args.packed))
+    elif args.command == 'score':
+        total = score_csv(args.input, args.out, algorithm=args.algorithm, chunksize=args.chunksize,
+                          engine=args.engine, voting=args.voting, progress=sys.stderr)
+        print(f'Scored {total} rows', file=sys.stderr)
+    elif args.command == 'compact':
+        bundle = REGISTRY.install(compact_models(min_trees=args.min_trees, verbose=True))
+        print('Exported', save_models(bundle.payload))
+        print('Exported', export_compiled())
+        print(f'Serve it with PEP_MODEL_VERSION={bundle.version}')
+    elif args.command == 'evaluate':
+        grid = {f: DEFAULT_EVAL_GRID[f] for f in args.family} if args.family else None
+        rows = evaluate_models(grid, folds=args.folds, n_jobs=args.n_jobs,
+                               random_state=args.seed, verbose=True)
+        print(format_evaluation(rows, min_accuracy=args.min_accuracy))
+        if args.out:
+            with open(args.out, 'w') as fh:
+                json.dump(rows, fh, indent=2)
+    else:
+        # no command: build models with verbose output and run a demo prediction
+        build_models(verbose=True)
+        sample = {'itching','skin_rash','nodal_skin_eruptions'}
+        print('Sample prediction ->', predict_symptoms(sample))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(_main())
@@ -0,0 +1,50 @@
+"""Compare batch scoring throughput against the per-row predict_symptoms loop.
+
+Run from the repository root:
+
+    python bench/bench_batch.py --rows 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PEP import build_models, predict_batch, predict_symptoms  # noqa: E402
+
+
+def _random_records(symptoms, n, seed=0):
+    rng = random.Random(seed)
+    return [rng.sample(symptoms, rng.randint(3, 6)) for _ in range(n)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--loop-rows', type=int, default=500,
+                        help='rows scored with the per-row loop (it is slow)')
+    args = parser.parse_args(argv)
+
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    records = _random_records(symptoms, args.rows)
+
+    print(f'{"algorithm":<10}{"loop rows/s":>14}{"batch rows/s":>14}{"speedup":>10}')
+    for algo in ('tree', 'random', 'gnb'):
+        loop_records = records[:args.loop_rows]
+        t0 = time.perf_counter()
+        loop_preds = [predict_symptoms(r, algorithm=algo) for r in loop_records]
+        loop_rate = len(loop_records) / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        batch_preds = predict_batch(records, algorithm=algo)
+        batch_rate = len(records) / (time.perf_counter() - t0)
+
+        assert batch_preds[:len(loop_preds)] == loop_preds
+        print(f'{algo:<10}{loop_rate:>14,.0f}{batch_rate:>14,.0f}{batch_rate / loop_rate:>9.0f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Compare the full models with their compacted version (PEP.compact_models).
+
+Prints the size reductions, then single-row and 10k-row batch latency per
+algorithm for both engines. Run from the repository root:
+
+    python bench/bench_compact.py --min-trees 10
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PEP  # noqa: E402
+from benchutil import best, random_records  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-trees', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args(argv)
+
+    PEP.build_models(verbose=False)
+    full = PEP.REGISTRY.active
+    compact = PEP.REGISTRY.install(PEP.compact_models(min_trees=args.min_trees), activate=False)
+    print(PEP.format_compaction(compact.payload['compaction']))
+    print()
+
+    sample = ['stomach_pain', 'acidity', 'vomiting']
+    X = random_records(len(full.symptoms), args.rows)
+    print(f'{"algorithm":<10}{"engine":<10}{"1 row us":>20}{f"{args.rows} rows ms":>24}')
+    for algo in PEP.ALGORITHMS + ('auto',):
+        for engine in PEP.ENGINES:
+            single, batch = [], []
+            for bundle in (full, compact):
+                single.append(best(lambda: PEP.predict_symptoms(
+                    sample, algorithm=algo, use_cache=False, engine=engine,
+                    version=bundle.version), 200))
+                batch.append(best(lambda: PEP.predict_batch(
+                    X, algorithm=algo, engine=engine, version=bundle.version), 1, repeat=3))
+            print(f'{algo:<10}{engine:<10}'
+                  f'{single[0] * 1e6:>9.1f} -> {single[1] * 1e6:>7.1f}'
+                  f'{batch[0] * 1e3:>12.1f} -> {batch[1] * 1e3:>9.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""Compare loading the training data from the CSVs and the compact dataset.
+
+Reports load time and peak Python/NumPy memory (tracemalloc) for each source.
+``auto`` is the default path: it checks the compact dataset against the CSVs'
+hash before memory-mapping it. The compact dataset is written to a temporary
+directory first, so the repo's own ``data/`` is left alone. Run from the repository root:
+
+    python bench/bench_dataset.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PEP  # noqa: E402
+
+
+def _measure(source, repeat):
+    best = float('inf')
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        data = PEP.load_training_data(source=source)
+        # touch the features so memory-mapped pages are actually read
+        int(data['X_train'].sum())
+        best = min(best, time.perf_counter() - t0)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return best, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    import pandas  # noqa: F401  -- keep import cost out of the CSV timing
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f'{"source":<18}{"load ms":>10}{"peak MiB":>10}')
+        _measure('csv', 1)
+        seconds, peak = _measure('csv', args.repeat)
+        print(f'{"csv":<18}{seconds * 1e3:>10.1f}{peak / 2**20:>10.2f}')
+        for packed in (False, True):
+            PEP.DATA_DIR = os.path.join(tmp, f'packed-{packed}')
+            PEP.convert_dataset(packed=packed)
+            name = 'packed' if packed else 'uint8'
+            for source in ('compact', 'auto'):
+                seconds, peak = _measure(source, args.repeat)
+                print(f'{source + " " + name:<18}{seconds * 1e3:>10.1f}{peak / 2**20:>10.2f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
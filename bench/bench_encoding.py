@@ -0,0 +1,50 @@
+"""Micro-benchmark the feature encoding used before each prediction.
+
+Compares the old per-request ``set`` + list comprehension over every symptom
+with the precomputed column index (reusing one output row) and the packed
+integer bitset. Run from the repository root:
+
+    python bench/bench_encoding.py
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from PEP import build_models, encode_symptoms, symptom_bitset  # noqa: E402
+
+
+def _legacy_encode(input_symptoms, symptoms):
+    input_set = set(map(str, input_symptoms))
+    return np.asarray([[1 if s in input_set else 0 for s in symptoms]], dtype=np.uint8)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    sample = ['stomach_pain', 'acidity', 'vomiting', 'indigestion']
+    out = np.zeros(len(symptoms), dtype=np.uint8)
+
+    cases = {
+        'legacy list comprehension': lambda: _legacy_encode(sample, symptoms),
+        'encode_symptoms (new row)': lambda: encode_symptoms(sample),
+        'encode_symptoms (reused row)': lambda: encode_symptoms(sample, out=out),
+        'symptom_bitset': lambda: symptom_bitset(sample),
+    }
+    baseline = None
+    for name, fn in cases.items():
+        per_call = min(timeit.repeat(fn, number=args.number, repeat=5)) / args.number
+        baseline = baseline or per_call
+        print(f'{name:<30}{per_call * 1e6:>8.2f} us{baseline / per_call:>8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Compare the sklearn and compiled inference engines.
+
+Reports single-row latency and batch throughput per algorithm. Run from the
+repository root:
+
+    python bench/bench_engines.py --rows 10000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+
+from PEP import build_models, compile_models, predict_batch  # noqa: E402
+from benchutil import best  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    compile_models()
+    rng = np.random.default_rng(0)
+    X = (rng.random((args.rows, len(symptoms))) < 0.04).astype(np.uint8)
+    row = X[:1]
+
+    print(f'{"algorithm":<10}{"engine":<10}{"single us":>12}{"batch rows/s":>16}')
+    for algo in ('tree', 'random', 'gnb', 'auto'):
+        for engine in ('sklearn', 'compiled'):
+            single = best(lambda: predict_batch(row, algorithm=algo, engine=engine), 1,
+                          args.repeat * 20)
+            batch = best(lambda: predict_batch(X, algorithm=algo, engine=engine), 1, args.repeat)
+            print(f'{algo:<10}{engine:<10}{single * 1e6:>12.1f}{args.rows / batch:>16,.0f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
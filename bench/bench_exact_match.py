@@ -0,0 +1,76 @@
+"""Measure the exact-match lookup shortcut and training on deduplicated rows.
+
+Prints single-row (uncached) and 10k-row batch latency with the lookup on and
+off, for inputs that are training profiles and inputs that are not, then the
+fit time and test accuracy of ``train_models`` with and without ``dedupe``.
+Run from the repository root:
+
+    python bench/bench_exact_match.py --rows 10000
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PEP  # noqa: E402
+from benchutil import best, random_records  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3, help='train_models rounds per setting')
+    args = parser.parse_args(argv)
+
+    PEP.build_models(verbose=False)
+    bundle = PEP.REGISTRY.active
+    data = PEP.load_training_data()
+    X_train = np.asarray(data['X_train'])
+    index = bundle.exact_match()
+    print(f'{len(X_train)} training rows -> {len(index.keys)} profiles, '
+          f'index {index.nbytes / 1024:.1f} KiB')
+    print()
+
+    rng = np.random.default_rng(0)
+    inputs = {
+        'profile': (X_train[0], X_train[rng.integers(len(X_train), size=args.rows)]),
+        'random': (random_records(len(bundle.symptoms), 1)[0],
+                   random_records(len(bundle.symptoms), args.rows)),
+    }
+    print(f'{"algorithm":<10}{"input":<10}{"1 row us off/on":>22}'
+          f'{f"{args.rows} rows ms off/on":>26}')
+    for algo in PEP.ALGORITHMS + ('auto',):
+        for kind, (row, X) in inputs.items():
+            names = [bundle.symptoms[c] for c in np.flatnonzero(row)]
+            single, batch = [], []
+            for exact in (False, True):
+                single.append(best(lambda: PEP.predict_symptoms(
+                    names, algorithm=algo, use_cache=False, exact_match=exact), 200))
+                batch.append(best(lambda: PEP.predict_batch(
+                    X, algorithm=algo, exact_match=exact), 1))
+            print(f'{algo:<10}{kind:<10}'
+                  f'{single[0] * 1e6:>11.1f} -> {single[1] * 1e6:>6.1f}'
+                  f'{batch[0] * 1e3:>15.2f} -> {batch[1] * 1e3:>6.2f}')
+    print()
+
+    X_test, y_test = np.asarray(data['X_test']), np.asarray(data['y_test'])
+    print(f'{"dedupe":<8}{"total s":>10}' + ''.join(f'{a + " s":>10}' for a in PEP.ALGORITHMS)
+          + ''.join(f'{a + " acc":>12}' for a in PEP.ALGORITHMS))
+    for dedupe in (False, True):
+        config = PEP.TrainConfig(dedupe=dedupe)
+        runs = [PEP.train_models(config=config) for _ in range(args.repeat)]
+        fit = {a: min(r['fit_times'][a] for r in runs) for a in PEP.ALGORITHMS}
+        total = min(r['train_seconds'] for r in runs)
+        models = dict(zip(PEP.ALGORITHMS, (runs[0][k] for k in ('tree', 'forest', 'gnb'))))
+        acc = {a: (models[a].predict(X_test) == y_test).mean() for a in PEP.ALGORITHMS}
+        print(f'{str(dedupe):<8}{total:>10.3f}'
+              + ''.join(f'{fit[a]:>10.3f}' for a in PEP.ALGORITHMS)
+              + ''.join(f'{acc[a]:>12.3f}' for a in PEP.ALGORITHMS))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""Report what ``import PEP`` costs, using ``python -X importtime``.
+
+Prints the total import time, the slowest modules and any heavy modules that
+were pulled in. It exits non-zero if a module that must stay off the
+prediction import path (plotting, pandas, scikit-learn, joblib) got imported,
+so it can be used as a regression guard. Run from the repository root:
+
+    python bench/bench_import.py --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# must not be imported by ``import PEP`` itself
+FORBIDDEN = ('matplotlib', 'seaborn', 'pandas', 'sklearn', 'joblib', 'scipy')
+
+
+def import_times(statement='import PEP'):
+    """Return [(module, self_us, cumulative_us)] for ``statement`` in a fresh interpreter."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=REPO_DIR, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--statement', default='import PEP')
+    args = parser.parse_args(argv)
+
+    rows = import_times(args.statement)
+    total = next(cum for name, _, cum in rows if name == 'PEP') if args.statement == 'import PEP' \
+        else sum(self_us for _, self_us, _ in rows)
+    print(f'{args.statement!r}: {total / 1000:.1f} ms, {len(rows)} modules')
+    for name, self_us, cum in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f'  {self_us / 1000:8.1f} ms self {cum / 1000:8.1f} ms cumulative  {name}')
+
+    leaked = sorted({name.split('.')[0] for name, _, _ in rows} & set(FORBIDDEN))
+    if leaked and args.statement == 'import PEP':
+        print('FAIL: heavy modules imported by PEP:', ', '.join(leaked))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,42 @@
+"""Measure the overhead of prediction instrumentation.
+
+Times cached ``predict_symptoms`` and single-row ``predict_batch`` calls with
+instrumentation off and on. Run from the repository root:
+
+    python bench/bench_instrumentation.py --number 20000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PEP  # noqa: E402
+from benchutil import best  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='calls per round')
+    args = parser.parse_args(argv)
+
+    PEP.build_models(verbose=False)
+    sample = ['stomach_pain', 'acidity', 'vomiting']
+    cases = {
+        'predict_symptoms (cached)': lambda: PEP.predict_symptoms(sample, algorithm='auto'),
+        'predict_batch (1 row)': lambda: PEP.predict_batch([sample], algorithm='tree'),
+    }
+    print(f'{"call":<28}{"off us":>10}{"on us":>10}{"overhead":>10}')
+    for name, fn in cases.items():
+        number = args.number if 'cached' in name else args.number // 20
+        PEP.enable_instrumentation(False)
+        off = best(fn, number)
+        PEP.enable_instrumentation(True)
+        on = best(fn, number)
+        PEP.enable_instrumentation(False)
+        print(f'{name:<28}{off * 1e6:>10.2f}{on * 1e6:>10.2f}{on / off - 1:>+10.1%}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
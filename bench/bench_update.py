@@ -0,0 +1,56 @@
+"""Compare update_models on new cases against a cold retrain.
+
+New cases are sampled from Testing.csv. Run from the repository root:
+
+    python bench/bench_update.py --rows 50 --repeat 3
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PEP  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50)
+    parser.add_argument('--new-trees', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    PEP.build_models(verbose=False)
+    original = PEP.REGISTRY.active
+    data = PEP.load_training_data()
+    rng = np.random.default_rng(0)
+    picks = rng.integers(0, len(data['X_test']), size=args.rows)
+    X = data['X_test'][picks]
+    labels = [original.disease[i] for i in data['y_test'][picks]]
+
+    cold = []
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        PEP.train_models()
+        cold.append(time.perf_counter() - t0)
+
+    warm = []
+    for _ in range(args.repeat):
+        PEP.REGISTRY.install(original)
+        t0 = time.perf_counter()
+        PEP.update_models(X, labels, n_new_trees=args.new_trees).result()
+        warm.append(time.perf_counter() - t0)
+    PEP.REGISTRY.install(original)
+
+    cold_s, warm_s = min(cold), min(warm)
+    print(f'{"cold retrain":<24}{cold_s:8.3f}s')
+    print(f'{f"update ({args.rows} rows)":<24}{warm_s:8.3f}s')
+    print(f'{"speedup":<24}{cold_s / warm_s:8.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
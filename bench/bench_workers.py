@@ -0,0 +1,87 @@
+"""Measure per-worker memory of the pre-forked inference server.
+
+Starts ``serve.py --workers N`` for each engine, sends some traffic so every
+worker has touched its models, then reads RSS and PSS (the proportional share
+of pages shared with other processes) from /proc. Linux only.
+
+Run from the repository root:
+
+    python bench/bench_workers.py --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _memory_kb(pid):
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as fh:
+        for line in fh:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                fields[name] = int(rest.split()[0])
+    return fields
+
+
+def _children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as fh:
+        return [int(p) for p in fh.read().split()]
+
+
+def _post(url, body):
+    req = urllib.request.Request(url, data=json.dumps(body).encode(),
+                                 headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.load(resp)
+
+
+def measure(engine, workers, port, requests=200):
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py'), '--workers',
+                             str(workers), '--port', str(port), '--engine', engine],
+                            stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}'
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                urllib.request.urlopen(f'{url}/readyz', timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline or proc.poll() is not None:
+                    raise RuntimeError(f'server for engine {engine!r} did not become ready')
+                time.sleep(0.2)
+        for algo in ('tree', 'random', 'gnb') * (requests // 3):
+            _post(f'{url}/predict', {'symptoms': ['itching', 'skin_rash'], 'algorithm': algo})
+        pids = _children(proc.pid)
+        return _memory_kb(proc.pid), [_memory_kb(pid) for pid in pids]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+
+    print(f'{"engine":<10}{"process":<10}{"RSS MiB":>10}{"PSS MiB":>10}')
+    for engine in ('sklearn', 'compiled'):
+        parent, workers = measure(engine, args.workers, args.port)
+        rows = [('parent', parent)] + [(f'worker{i}', w) for i, w in enumerate(workers)]
+        for name, mem in rows:
+            print(f'{engine:<10}{name:<10}{mem["Rss"] / 1024:>10.1f}{mem["Pss"] / 1024:>10.1f}')
+        total = sum(mem['Pss'] for _, mem in rows)
+        print(f'{engine:<10}{"total":<10}{"":>10}{total / 1024:>10.1f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
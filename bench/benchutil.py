@@ -0,0 +1,37 @@
+"""Helpers shared by the benchmark scripts in this directory.
+
+The scripts are run directly (``python bench/<script>.py``), which puts this
+directory on ``sys.path``, so they import it as ``benchutil``.
+"""
+import time
+
+import numpy as np
+
+
+def timing_rounds(fn, repeat=5, number=1):
+    """Call ``fn`` once to warm up, then return seconds per call for each round.
+
+    Each of the ``repeat`` rounds times ``number`` back-to-back calls.
+    """
+    fn()
+    rounds = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - t0) / number)
+    return rounds
+
+
+def best(fn, number, repeat=5):
+    """Return the best (lowest) seconds per call over ``timing_rounds``."""
+    return min(timing_rounds(fn, repeat, number))
+
+
+def random_records(n_symptoms, n, seed=0):
+    """Return an (n, n_symptoms) 0/1 uint8 matrix with 3-6 symptoms set per row."""
+    rng = np.random.default_rng(seed)
+    X = np.zeros((n, n_symptoms), dtype=np.uint8)
+    for row in X:
+        row[rng.choice(n_symptoms, rng.integers(3, 7), replace=False)] = 1
+    return X
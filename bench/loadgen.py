@@ -0,0 +1,97 @@
+"""Load generator for serve.py reporting latency percentiles and throughput.
+
+Opens ``--concurrency`` keep-alive connections that each send single-patient
+``/predict`` requests back to back for ``--duration`` seconds. Run the server
+first, then e.g.:
+
+    python serve.py --port 8000 &
+    python bench/loadgen.py --port 8000 --concurrency 64 --duration 10 --algorithm auto
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import PEP  # noqa: E402
+
+
+async def _client(host, port, bodies, deadline, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        i = 0
+        while time.perf_counter() < deadline:
+            body = bodies[i % len(bodies)]
+            i += 1
+            start = time.perf_counter()
+            writer.write(b'POST /predict HTTP/1.1\r\nHost: pep\r\nContent-Type: application/json\r\n'
+                         b'Content-Length: %d\r\n\r\n' % len(body) + body)
+            await writer.drain()
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+            await reader.readexactly(length)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+async def run(host, port, concurrency, duration, algorithm, seed=0):
+    """Run the load test and return a dict of results."""
+    rng = random.Random(seed)
+    symptoms = PEP.symptoms
+    bodies = [json.dumps({'symptoms': rng.sample(symptoms, rng.randint(3, 6)),
+                          'algorithm': algorithm}).encode() for _ in range(1000)]
+    latencies, errors = [], []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_client(host, port, bodies[i::concurrency] or bodies, deadline,
+                                   latencies, errors) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': len(latencies) / elapsed,
+        'p50_ms': _percentile(latencies, 50) * 1e3,
+        'p99_ms': _percentile(latencies, 99) * 1e3,
+        'max_ms': (latencies[-1] if latencies else float('nan')) * 1e3,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--algorithm', default='tree', choices=PEP.ALGORITHMS + ('auto',))
+    args = parser.parse_args(argv)
+
+    result = asyncio.run(run(args.host, args.port, args.concurrency, args.duration, args.algorithm))
+    print(f'{result["requests"]} requests ({result["errors"]} errors) in {args.duration:.1f}s: '
+          f'{result["throughput_rps"]:,.0f} req/s, p50 {result["p50_ms"]:.2f} ms, '
+          f'p99 {result["p99_ms"]:.2f} ms, max {result["max_ms"]:.2f} ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Run the benchmark suite, write the results as JSON and check for regressions.
+
+Covers model build (cold process and warm call), CSV loading, label mapping,
+single-row predictions per algorithm, the Auto vote, next-symptom
+suggestions, batch scoring at 1/100/10k rows and peak memory. Every metric
+is "lower is better". Run from the repository root:
+
+    python bench/run.py --out bench-results.json
+    python bench/run.py --baseline bench-results.json --threshold 0.25
+
+With ``--baseline`` the exit status is 1 when any metric is more than
+``--threshold`` (a fraction) worse than in the baseline file. Timings are
+compared on their best round; the JSON also keeps the median as ``value``.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+import PEP  # noqa: E402
+from benchutil import random_records, timing_rounds  # noqa: E402
+
+_COLD_SCRIPT = '''
+import resource, sys, time
+t0 = time.perf_counter()
+import PEP
+PEP.build_models(verbose=False)
+elapsed = time.perf_counter() - t0
+X = PEP.load_training_data()['X_test']
+# Testing.csv rows are all training profiles: run the models, not the lookup
+PEP.predict_batch(X.repeat(250, axis=0), algorithm='auto', exact_match=False)
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(elapsed, rss * (1 if sys.platform == 'darwin' else 1024))
+'''
+
+
+def _timeit(fn, repeat, number=1):
+    """Median and best seconds per call over ``repeat`` rounds of ``number`` calls."""
+    rounds = timing_rounds(fn, repeat, number)
+    return {'value': statistics.median(rounds), 'best': min(rounds), 'unit': 's'}
+
+
+def run(repeat=5, only=None):
+    results = {}
+
+    def record(name, fn):
+        if only and not any(pattern in name for pattern in only):
+            return
+        results[name] = fn()
+        print(f'{name:<34}{_format(results[name])}', file=sys.stderr, flush=True)
+
+    cold_samples = []
+
+    def cold():
+        # a fresh interpreter loading the exported artifact, then scoring 10k rows
+        for _ in range(max(1, repeat // 2)):
+            out = subprocess.run([sys.executable, '-c', _COLD_SCRIPT], cwd=ROOT, check=True,
+                                 capture_output=True, text=True).stdout.split()
+            cold_samples.append((float(out[0]), int(out[1])))
+        return {'value': statistics.median(s for s, _ in cold_samples), 'unit': 's'}
+
+    record('build_models.cold', cold)
+    if cold_samples:
+        record('memory.peak_rss_cold_10k', lambda: {
+            'value': max(rss for _, rss in cold_samples) / 2**20, 'unit': 'MiB'})
+
+    PEP.build_models(verbose=False)
+    record('build_models.warm', lambda: _timeit(PEP.build_models, repeat, number=1000))
+    record('load.csv', lambda: _timeit(lambda: PEP.load_training_data(source='csv'), repeat))
+
+    import pandas as pd
+    train_path, test_path = PEP._data_paths()
+    labels = pd.concat([pd.read_csv(p, usecols=['prognosis'])['prognosis']
+                        for p in (train_path, test_path)]).unique()
+    record('load.label_mapping',
+           lambda: _timeit(lambda: PEP._label_mapping(labels, list(PEP.disease)), repeat, 20))
+
+    sample = ['stomach_pain', 'acidity', 'vomiting']
+    for algo in PEP.ALGORITHMS + ('auto',):
+        record(f'predict_symptoms.{algo}', lambda algo=algo: _timeit(
+            lambda: PEP.predict_symptoms(sample, algorithm=algo, use_cache=False), repeat, 50))
+    record('predict_symptoms.auto_cached', lambda: _timeit(
+        lambda: PEP.predict_symptoms(sample, algorithm='auto'), repeat, 1000))
+    for selection in ([], ['itching'], sample):
+        record(f'suggest_symptoms.{len(selection)}', lambda selection=selection: _timeit(
+            lambda: PEP.suggest_symptoms(selection), repeat, 200))
+
+    bundle = PEP.REGISTRY.get()
+    for n in (1, 100, 10000):
+        X = random_records(len(bundle.symptoms), n)
+        for algo in ('tree', 'auto'):
+            number = max(1, 1000 // n)
+            record(f'predict_batch.{algo}.{n}', lambda X=X, algo=algo, number=number: _timeit(
+                lambda: PEP.predict_batch(X, algorithm=algo), repeat, number))
+
+    def batch_memory():
+        X = random_records(len(bundle.symptoms), 10000)
+        tracemalloc.start()
+        PEP.predict_batch(X, algorithm='auto')
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {'value': peak / 2**20, 'unit': 'MiB'}
+
+    record('memory.predict_batch_auto_10k', batch_memory)
+    return results
+
+
+def _format(metric, value=None):
+    unit = metric['unit']
+    value = metric['value'] if value is None else value
+    if unit == 's':
+        if value < 1e-3:
+            return f'{value * 1e6:10.1f} us'
+        if value < 1:
+            return f'{value * 1e3:10.2f} ms'
+        return f'{value:10.3f} s'
+    return f'{value:10.1f} {unit}'
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names of regressed metrics."""
+    regressions = []
+    print(f'{"metric (best)":<34}{"baseline":>14}{"current":>14}{"change":>9}')
+    for name, metric in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f'{name:<34}{"-":>14}{_format(metric):>14}{"new":>9}')
+            continue
+        # timings compare best rounds: the minimum is far less noisy than the median
+        new_value, old_value = metric.get('best', metric['value']), old.get('best', old['value'])
+        change = new_value / old_value - 1 if old_value else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:<34}{_format(old, old_value):>14}{_format(metric, new_value):>14}'
+              f'{change:>+9.0%}{flag}')
+    return regressions
+
+
+def _meta():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'sklearn': PEP._sklearn_version(),
+        'model_version': PEP.REGISTRY.get().version,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed slowdown as a fraction of the baseline (default 0.25)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', action='append',
+                        help='run metrics whose name contains this (repeatable)')
+    args = parser.parse_args(argv)
+
+    results = run(repeat=args.repeat, only=args.only)
+    report = {'meta': _meta(), 'results': results}
+    if args.out:
+        with open(args.out, 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}: '
+                  f'{", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,354 @@
+"""Asyncio HTTP JSON inference server for the PEP models.
+
+Only the standard library (plus the PEP model stack) is used. Models are loaded
+once at start-up; concurrent requests are coalesced into micro-batches so each
+batch is scored with a single vectorized ``predict_batch`` call.
+
+Endpoints:
+    POST /predict  {"symptoms": [...]} or {"records": [[...], ...]},
+                   optional "algorithm" ('tree', 'random', 'gnb', 'auto')
+                   and "voting" ('hard', 'soft')
+    GET  /healthz  process is up
+    GET  /readyz   models are loaded (503 until then)
+    GET  /stats    micro-batching counters
+
+Run locally:
+
+    python serve.py --port 8000 --batch-window-ms 2 --max-batch 256
+
+With ``--workers N`` the models are loaded once, then N processes are forked
+to serve from the same socket. With ``--engine compiled`` the workers score
+from memory-mapped flat tree arrays, so they share one resident copy.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+
+import numpy as np
+
+import PEP
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 503: 'Service Unavailable'}
+_MAX_BODY = 1 << 20
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class MicroBatcher:
+    """Coalesce concurrent prediction requests into vectorized batches.
+
+    Requests with the same ``(algorithm, voting)`` are queued together. A queue
+    is flushed when it reaches ``max_rows`` rows or ``window`` seconds after
+    its first request arrived, whichever comes first. Scoring runs in the
+    default executor so the event loop keeps accepting requests meanwhile.
+    """
+
+    def __init__(self, window=0.002, max_rows=256, engine=None):
+        self.window = window
+        self.max_rows = max_rows
+        self.engine = engine
+        self._pending = {}
+        self._timers = {}
+        self.batches = 0
+        self.rows = 0
+        self.requests = 0
+
+    async def submit(self, X, algorithm='tree', voting='hard'):
+        """Queue an encoded (n, n_symptoms) matrix and await its predictions."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (algorithm, voting)
+        queue = self._pending.setdefault(key, [])
+        queue.append((X, future))
+        self.requests += 1
+        if sum(len(x) for x, _ in queue) >= self.max_rows:
+            self._flush(key)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'rows': self.rows,
+            'mean_batch_rows': self.rows / self.batches if self.batches else 0.0,
+            'window_ms': self.window * 1e3,
+            'max_batch': self.max_rows,
+        }
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        queue = self._pending.pop(key, None)
+        if queue:
+            asyncio.get_running_loop().create_task(self._run(key, queue))
+
+    async def _run(self, key, queue):
+        algorithm, voting = key
+        X = np.concatenate([x for x, _ in queue]) if len(queue) > 1 else queue[0][0]
+        self.batches += 1
+        self.rows += len(X)
+        loop = asyncio.get_running_loop()
+        try:
+            preds = await loop.run_in_executor(
+                None, lambda: PEP.predict_batch(X, algorithm=algorithm, voting=voting,
+                                                engine=self.engine))
+        except Exception as exc:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        start = 0
+        for x, future in queue:
+            if not future.done():
+                future.set_result(preds[start:start + len(x)])
+            start += len(x)
+
+
+class InferenceServer:
+    """HTTP/1.1 keep-alive server that routes requests to a MicroBatcher."""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self.ready = False
+        self.load_error = None
+
+    async def load_models(self):
+        loop = asyncio.get_running_loop()
+        try:
+            if (self.batcher.engine or PEP.DEFAULT_ENGINE) != 'compiled':
+                await loop.run_in_executor(None, PEP.build_models)
+            elif PEP.REGISTRY.active is None:
+                # memory-mapped arrays: no sklearn import, pages shared between workers
+                await loop.run_in_executor(None, PEP.load_compiled_models)
+        except Exception as exc:
+            self.load_error = repr(exc)
+            raise
+        self.ready = True
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, payload = await self._dispatch(method, path, body)
+                except HTTPError as exc:
+                    status, payload = exc.status, {'error': str(exc)}
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as exc:
+            self._write_response(writer, exc.status, {'error': str(exc)}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, 'malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HTTPError(400, 'invalid Content-Length')
+        if length > _MAX_BODY:
+            raise HTTPError(413, 'request body too large')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), path.split('?', 1)[0], headers, body
+
+    async def _dispatch(self, method, path, body):
+        if path == '/healthz':
+            return 200, {'status': 'ok'}
+        if path == '/readyz':
+            if self.ready:
+                return 200, {'status': 'ready'}
+            return 503, {'status': 'loading', 'error': self.load_error}
+        if path == '/stats':
+            return 200, self.batcher.stats()
+        if path != '/predict':
+            raise HTTPError(404, f'no route for {path}')
+        if method != 'POST':
+            raise HTTPError(405, 'use POST')
+        if not self.ready:
+            raise HTTPError(503, 'models are still loading')
+        return 200, await self._predict(body)
+
+    async def _predict(self, body):
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, 'body must be JSON')
+        if not isinstance(request, dict):
+            raise HTTPError(400, 'body must be a JSON object')
+        algorithm = request.get('algorithm', 'tree')
+        voting = request.get('voting', 'hard')
+        if algorithm not in PEP.ALGORITHMS + ('auto',):
+            raise HTTPError(400, f'unknown algorithm {algorithm!r}')
+        if voting not in ('hard', 'soft'):
+            raise HTTPError(400, f'unknown voting {voting!r}')
+        single = 'symptoms' in request
+        records = [request['symptoms']] if single else request.get('records')
+        if not isinstance(records, list) or not all(isinstance(r, list) for r in records):
+            raise HTTPError(400, "expected 'symptoms': [...] or 'records': [[...], ...]")
+        # encode per request so a bad record only fails its own request
+        X = np.zeros((len(records), len(PEP.symptom_index())), dtype=np.uint8)
+        try:
+            for row, rec in enumerate(records):
+                PEP.encode_symptoms(rec, out=X[row])
+        except PEP.UnknownSymptomError as exc:
+            raise HTTPError(400, str(exc))
+        preds = await self.batcher.submit(X, algorithm, voting) if len(X) else []
+        if single:
+            return {'prediction': preds[0]}
+        return {'predictions': preds}
+
+    @staticmethod
+    def _write_response(writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode()
+        head = (f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\n'
+                'Content-Type: application/json\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+
+
+async def start_server(host='127.0.0.1', port=8000, window=0.002, max_rows=256, engine=None,
+                       wait_ready=False, **server_kwargs):
+    """Start serving and return ``(asyncio_server, InferenceServer)``.
+
+    Models load in the background; ``/readyz`` reports when they are done.
+    With ``wait_ready=True`` this only returns once they are loaded.
+    """
+    app = InferenceServer(MicroBatcher(window=window, max_rows=max_rows, engine=engine))
+    server = await asyncio.start_server(app.handle, host, port, **server_kwargs)
+    loading = asyncio.get_running_loop().create_task(app.load_models())
+    if wait_ready:
+        await loading
+    return server, app
+
+
+async def _serve(args, sock=None):
+    start = time.perf_counter()
+    where = {'host': None, 'port': None, 'sock': sock} if sock is not None else {
+        'host': args.host, 'port': args.port}
+    server, app = await start_server(window=args.batch_window_ms / 1e3, max_rows=args.max_batch,
+                                     engine=args.engine, **where)
+    addr = server.sockets[0].getsockname()
+    print(f'[{os.getpid()}] Serving on http://{addr[0]}:{addr[1]}', file=sys.stderr, flush=True)
+    while not app.ready and app.load_error is None:
+        await asyncio.sleep(0.05)
+    if app.ready:
+        print(f'Models ready after {time.perf_counter() - start:.2f}s', file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def _preload(engine):
+    """Load the models in the parent so forked workers inherit them."""
+    if (engine or PEP.DEFAULT_ENGINE) == 'compiled':
+        PEP.load_compiled_models()
+    else:
+        PEP.build_models()
+    # keep the inherited objects out of the workers' collections: gc would
+    # otherwise touch their headers and un-share the pages (copy-on-write)
+    gc.collect()
+    gc.freeze()
+
+
+def _run_worker(args, sock):
+    try:
+        asyncio.run(_serve(args, sock))
+    except KeyboardInterrupt:
+        pass
+    os._exit(0)
+
+
+def _prefork(args):
+    """Serve from ``args.workers`` forked processes sharing one listening socket."""
+    sock = socket.create_server((args.host, args.port))
+    _preload(args.engine)
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(args, sock)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    finally:
+        sock.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='PEP HTTP inference server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--batch-window-ms', type=float, default=2.0,
+                        help='how long to wait for more requests before scoring a batch')
+    parser.add_argument('--max-batch', type=int, default=256,
+                        help='score a batch as soon as it has this many rows')
+    parser.add_argument('--engine', choices=PEP.ENGINES, default=None)
+    parser.add_argument('--model-version', default=PEP.MODEL_VERSION,
+                        help='serve this exported artifact version (default PEP_MODEL_VERSION, '
+                             'else the one for the default training config)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='pre-fork this many worker processes sharing the models')
+    args = parser.parse_args(argv)
+    PEP.MODEL_VERSION = args.model_version
+    if args.workers > 1:
+        if not hasattr(os, 'fork'):
+            parser.error('--workers needs os.fork (POSIX)')
+        return _prefork(args)
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,6 @@
 import streamlit as st
-from collections import Counter
 
-from PEP import build_models, predict_symptoms
+from PEP import build_models, predict_symptoms, prediction_cache_stats, suggest_symptoms
 
 # Cache models so they are built once per session
 @st.cache_resource(show_spinner=True)
@@ -33,6 +32,17 @@ with left:
         options=all_symptoms,
         format_func=lambda s: s.replace('_', ' '),
     )
+    # hints come from the co-occurrence index stored with the models, no model runs
+    hints = suggest_symptoms(selected, k=6)
+    if hints['next']:
+        st.caption("Symptoms that would narrow it down: "
+                   + ", ".join(s.replace('_', ' ') for s, _ in hints['next']))
+    if selected and hints['exact']:
+        st.caption(f"Consistent with {len(hints['diseases'])} condition(s): "
+                   + ", ".join(hints['diseases'][:8]))
+    elif selected:
+        st.caption("No training case has all of these symptoms. Closest: "
+                   + ", ".join(hints['diseases'][:8]))
 
 with right:
     alg = st.radio(
@@ -47,23 +57,17 @@ if predict_clicked:
     if not selected:
         st.info("Please select at least one symptom.")
     else:
+        votes = None
         if alg.startswith("Auto"):
-            p1 = predict_symptoms(selected, algorithm='tree')
-            p2 = predict_symptoms(selected, algorithm='random')
-            p3 = predict_symptoms(selected, algorithm='gnb')
-            votes = [p for p in (p1, p2, p3) if p]
-            if not votes:
-                pred = None
-            else:
-                cnt = Counter(votes)
-                pred, cntv = cnt.most_common(1)[0]
-                if cntv == 1 and len(set(votes)) > 1:
-                    pred = p1
+            # one encoding and one call per model, combined by majority vote
+            pred, votes = predict_symptoms(selected, algorithm='auto', return_votes=True)
         else:
             pred = predict_symptoms(selected, algorithm=alg)
 
         if pred:
             st.success(f"Predicted disease: {pred}")
+            if votes:
+                st.caption("Model votes: " + ", ".join(f"{a}: {v}" for a, v in votes.items()))
             st.caption(
                 "This prediction is for educational purposes only and not a medical diagnosis. "
                 "Please consult a licensed clinician."
@@ -71,5 +75,9 @@ if predict_clicked:
         else:
             st.error("Could not predict disease for the selected symptoms.")
 
+# Predictions are memoised in PEP's process-wide cache, shared by all sessions
+with st.sidebar.expander("Prediction cache"):
+    st.json(prediction_cache_stats())
+
 st.divider()
 st.write("Run locally: `streamlit run streamlit_app.py` ")
@@ -0,0 +1,17 @@
+import pytest
+
+import PEP
+
+
+@pytest.fixture(scope='session')
+def model_dir(tmp_path_factory):
+    """Directory the test session trains and exports its model artifacts into."""
+    return str(tmp_path_factory.mktemp('models'))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_model_dir(model_dir, monkeypatch):
+    # keep artifacts out of the source tree's models/, including in subprocesses;
+    # the directory is shared so the session trains the default models only once
+    monkeypatch.setattr(PEP, 'MODEL_DIR', model_dir)
+    monkeypatch.setenv('PEP_MODEL_DIR', model_dir)
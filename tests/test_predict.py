@@ -1,6 +1,21 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
 import types
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 
-from PEP import build_models, predict_symptoms
+import numpy as np
+import pandas as pd
+import pytest
+
+import PEP
+from PEP import (UnknownSymptomError, bitset_to_row, build_models, encode_symptoms,
+                 predict_batch, predict_symptoms, symptom_bitset, symptom_index)
 
 
 def test_build_models_returns_models():
@@ -20,3 +35,609 @@ def test_predict_returns_string_any_algorithm():
     for algo in ("tree", "random", "gnb"):
         pred = predict_symptoms(sample, algorithm=algo)
         assert isinstance(pred, str) and len(pred) > 0
+
+
+def test_build_models_exports_and_reloads_artifact():
+    tree, _, _, symptoms, diseases = build_models(verbose=False)
+    payload = PEP.load_models(PEP.artifact_path())
+    assert payload is not None
+    assert payload['version'] == PEP.model_version()
+    assert list(payload['symptoms']) == symptoms
+    assert list(payload['disease']) == diseases
+    row = [[1 if s in ('itching', 'skin_rash') else 0 for s in symptoms]]
+    assert payload['tree'].predict(row)[0] == tree.predict(row)[0]
+
+
+def test_build_models_honours_config_and_pinned_version(tmp_path, monkeypatch):
+    build_models(verbose=False)
+    registry, original = PEP.REGISTRY, PEP.REGISTRY.active
+    monkeypatch.setattr(PEP, 'MODEL_DIR', str(tmp_path))
+    config = PEP.TrainConfig(n_estimators=5)
+    version = PEP.model_version(config)
+    try:
+        # an active bundle with another config is not returned as-is
+        assert len(PEP.build_models(config=config)[1].estimators_) == 5
+        assert PEP.REGISTRY.active.version == version
+
+        # a fresh worker pinned to that version loads its artifact
+        monkeypatch.setenv('PEP_NO_TRAIN', '1')
+        monkeypatch.setattr(PEP, 'MODEL_VERSION', version)
+        monkeypatch.setattr(PEP, 'REGISTRY', PEP.ModelRegistry())
+        assert len(PEP.build_models()[1].estimators_) == 5
+        assert PEP.REGISTRY.active.version == version
+
+        # a pinned version without an artifact is an error, never a training run
+        monkeypatch.setattr(PEP, 'MODEL_VERSION', 'missing')
+        monkeypatch.setattr(PEP, 'REGISTRY', PEP.ModelRegistry())
+        monkeypatch.delenv('PEP_NO_TRAIN')
+        with pytest.raises(RuntimeError, match='export version missing'):
+            PEP.build_models()
+    finally:
+        registry.install(original)
+
+
+def test_predict_batch_matches_single_predictions():
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    records = [symptoms[:2], ['stomach_pain', 'acidity', 'vomiting'], symptoms[10:14]]
+    X = np.zeros((len(records), len(symptoms)), dtype=np.uint8)
+    for row, rec in enumerate(records):
+        X[row, [symptoms.index(s) for s in rec]] = 1
+
+    for algo in ("tree", "random", "gnb"):
+        expected = [predict_symptoms(r, algorithm=algo) for r in records]
+        assert predict_batch(records, algorithm=algo) == expected
+        assert predict_batch(X, algorithm=algo) == expected
+    assert predict_batch([]) == []
+
+
+def test_predict_batch_accepts_dataframes():
+    build_models(verbose=False)
+    # raw Testing.csv headers ('spotting_ urination') plus the prognosis column
+    frame = pd.read_csv(os.path.join(os.path.dirname(PEP.__file__), 'Testing.csv')).head(3)
+    expected = PEP.predict_batch(PEP.load_training_data()['X_test'][:3], exact_match=False)
+    assert PEP.predict_batch(frame, exact_match=False) == expected
+    assert PEP.predict_batch(
+        frame.drop(columns='prognosis').iloc[:, ::-1].astype(float), exact_match=False) == expected
+    with pytest.raises(ValueError, match='itching'):
+        PEP.predict_batch(frame.drop(columns=['itching']))
+
+
+def test_encode_symptoms_uses_column_index_and_reports_unknown():
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    index = symptom_index()
+    assert index['stomach_pain'] == symptoms.index('stomach_pain')
+    with pytest.raises(TypeError):
+        index['new_symptom'] = 0
+
+    row = encode_symptoms(['stomach_pain', 'acidity'])
+    assert row.dtype == np.uint8 and row.sum() == 2
+    out = np.ones(len(symptoms), dtype=np.uint8)
+    assert encode_symptoms(['acidity'], out=out) is out and out.sum() == 1
+
+    bits = symptom_bitset(['stomach_pain', 'acidity'])
+    assert bits == (1 << index['stomach_pain']) | (1 << index['acidity'])
+    assert (bitset_to_row(bits) == row).all()
+
+    with pytest.raises(UnknownSymptomError) as exc:
+        encode_symptoms(['stomach_pain', 'not_a_symptom'])
+    assert exc.value.unknown == ['not_a_symptom']
+    with pytest.raises(ValueError):
+        predict_symptoms(['not_a_symptom'])
+    assert predict_symptoms(row) == predict_symptoms(['stomach_pain', 'acidity'])
+
+
+def _legacy_auto_vote(sample):
+    p1, p2, p3 = (predict_symptoms(sample, algorithm=a) for a in ("tree", "random", "gnb"))
+    pred, cntv = Counter([p1, p2, p3]).most_common(1)[0]
+    if cntv == 1:
+        pred = p1
+    return pred
+
+
+def test_auto_vote_matches_legacy_majority_vote():
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    rng = random.Random(7)
+    records = [rng.sample(symptoms, rng.randint(1, 5)) for _ in range(60)]
+
+    winners, votes = predict_batch(records, algorithm='auto', return_votes=True)
+    assert winners == [_legacy_auto_vote(r) for r in records]
+    assert votes['gnb'] == predict_batch(records, algorithm='gnb')
+    pred, single_votes = predict_symptoms(records[0], algorithm='auto', return_votes=True)
+    assert pred == winners[0]
+    assert single_votes == {a: v[0] for a, v in votes.items()}
+
+
+def test_auto_vote_soft_and_weights():
+    records = [['stomach_pain', 'acidity', 'vomiting'], ['itching', 'skin_rash']]
+    gnb_only = predict_batch(records, algorithm='auto', weights={'tree': 0, 'random': 0, 'gnb': 1})
+    assert gnb_only == predict_batch(records, algorithm='gnb')
+    soft = predict_batch(records, algorithm='auto', voting='soft', weights=(0, 1, 0))
+    assert soft == predict_batch(records, algorithm='random')
+    with pytest.raises(ValueError):
+        predict_batch(records, algorithm='auto', voting='ranked')
+
+
+def test_prediction_cache_hits_evicts_and_invalidates():
+    build_models(verbose=False)
+    cache = PEP.configure_prediction_cache(maxsize=2)
+    try:
+        sample = ['stomach_pain', 'acidity', 'vomiting']
+        first = predict_symptoms(sample, algorithm='auto', return_votes=True)
+        assert predict_symptoms(list(reversed(sample)), algorithm='auto', return_votes=True) == first
+        stats = PEP.prediction_cache_stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+
+        predict_symptoms(['itching'], algorithm='tree')
+        predict_symptoms(['itching'], algorithm='gnb')
+        assert PEP.prediction_cache_stats()['evictions'] == 1
+
+        PEP.REGISTRY.install(PEP.load_models(PEP.artifact_path()))
+        assert cache.stats()['size'] == 0
+        assert predict_symptoms(sample, algorithm='tree', use_cache=False) == first[1]['tree']
+        assert cache.stats()['size'] == 0
+    finally:
+        PEP.configure_prediction_cache()
+
+
+def test_prediction_cache_ttl_expires(monkeypatch):
+    cache = PEP.PredictionCache(maxsize=4, ttl=10)
+    now = [100.0]
+    monkeypatch.setattr(PEP.time, 'monotonic', lambda: now[0])
+    cache.put('k', 'v')
+    assert cache.get('k') == 'v'
+    now[0] += 11
+    assert cache.get('k') is PEP.PredictionCache._MISSING
+    assert cache.stats()['expirations'] == 1
+
+
+def test_compiled_engine_matches_sklearn():
+    tree, forest, gnb, symptoms, _ = build_models(verbose=False)
+    test = pd.read_csv(os.path.join(os.path.dirname(PEP.__file__), 'Testing.csv'))
+    test.columns = test.columns.str.replace(' ', '', regex=False)
+    rng = np.random.default_rng(0)
+    random_rows = (rng.random((2000, len(symptoms))) < 0.04).astype(np.uint8)
+
+    compiled = PEP.compile_models()
+    for X in (test[symptoms].to_numpy(dtype=np.uint8), random_rows, random_rows[:5]):
+        for algo, model in (('tree', tree), ('random', forest), ('gnb', gnb)):
+            assert (compiled[algo].predict(X) == model.predict(X)).all()
+            assert (compiled[algo].predict(X.astype(float)) == model.predict(X)).all()
+            if algo != 'gnb':
+                assert (compiled[algo].predict_proba(X) == model.predict_proba(X)).all()
+        for algo in ('tree', 'random', 'gnb', 'auto'):
+            # Testing.csv rows are training profiles: compare the models, not the index
+            assert (PEP.predict_batch(X, algorithm=algo, engine='compiled', exact_match=False)
+                    == PEP.predict_batch(X, algorithm=algo, engine='sklearn', exact_match=False))
+    sample = ['stomach_pain', 'acidity', 'vomiting']
+    assert (predict_symptoms(sample, algorithm='random', engine='compiled', use_cache=False)
+            == predict_symptoms(sample, algorithm='random', use_cache=False))
+
+
+def test_train_models_is_reproducible_with_seed():
+    config = PEP.TrainConfig(n_estimators=10, random_state=3, n_jobs=2)
+    first = PEP.train_models(config=config)
+    second = PEP.train_models(config=PEP.TrainConfig(n_estimators=10, random_state=3,
+                                                     executor='process'))
+    assert set(first['fit_times']) == {'tree', 'random', 'gnb'}
+    assert first['version'] == second['version'] != PEP.model_version()
+    assert first['forest'].n_jobs is None
+    X = np.eye(len(first['symptoms']), dtype=np.uint8)
+    for key in ('tree', 'forest'):
+        assert (first[key].predict_proba(X) == second[key].predict_proba(X)).all()
+
+
+def test_import_pep_does_not_load_plotting_or_training_stack():
+    code = ("import sys, PEP; "
+            "print(sorted(m for m in ('matplotlib', 'seaborn', 'pandas', 'sklearn', 'joblib') "
+            "if m in sys.modules))")
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert out.stdout.strip() == '[]'
+
+
+def test_score_csv_streams_chunks(tmp_path):
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    test_csv = os.path.join(os.path.dirname(PEP.__file__), 'Testing.csv')
+    out = tmp_path / 'scored.csv'
+    # every Testing.csv row is a training profile: score with the models
+    assert PEP.score_csv(test_csv, str(out), algorithm='auto', chunksize=7,
+                         exact_match=False) == 41
+
+    scored = pd.read_csv(out)
+    expected = pd.read_csv(test_csv)
+    assert list(scored.columns) == ['prognosis', 'predicted']
+    assert list(scored['prognosis']) == list(expected['prognosis'])
+    expected.columns = [PEP._clean_column(c) for c in expected.columns]
+    X = expected[symptoms].to_numpy()
+    assert list(scored['predicted']) == PEP.predict_batch(X, algorithm='auto', exact_match=False)
+
+    bad = tmp_path / 'bad.csv'
+    expected.drop(columns=['itching']).to_csv(bad, index=False)
+    with pytest.raises(ValueError, match='itching'):
+        PEP.score_csv(str(bad), str(tmp_path / 'never.csv'))
+
+
+def test_compact_dataset_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(PEP, 'DATA_DIR', str(tmp_path / 'missing'))
+    with pytest.raises(FileNotFoundError):
+        PEP.load_training_data(source='compact')
+
+    csv_data = PEP.load_training_data(source='csv')
+    for packed in (False, True):
+        out_dir = tmp_path / f'packed-{packed}'
+        PEP.convert_dataset(out_dir=str(out_dir), packed=packed)
+        monkeypatch.setattr(PEP, 'DATA_DIR', str(out_dir))
+        compact = PEP.load_training_data()
+        if not packed:
+            assert isinstance(compact['X_train'], np.memmap)
+        for key in ('X_train', 'y_train', 'X_test', 'y_test'):
+            assert compact[key].dtype == csv_data[key].dtype
+            assert np.array_equal(compact[key], csv_data[key])
+        assert compact['label_mapping'] == csv_data['label_mapping']
+        assert compact['disease'] == csv_data['disease']
+
+
+def test_csv_digest_is_cached_until_a_file_changes(tmp_path, monkeypatch):
+    paths = [tmp_path / 'training.csv', tmp_path / 'Testing.csv']
+    for path in paths:
+        path.write_text('a,prognosis\n1,x\n')
+    monkeypatch.setattr(PEP, '_data_paths', lambda: tuple(str(p) for p in paths))
+    digest = PEP._csv_digest()
+    assert PEP._csv_digest() == digest
+    with open(paths[1], 'a') as fh:
+        fh.write('0,y\n')
+    assert PEP._csv_digest() != digest
+
+
+def test_compiled_arrays_are_memory_mapped_without_sklearn(tmp_path):
+    _, _, _, symptoms, _ = build_models(verbose=False)
+    records = [symptoms[i:i + 4] for i in range(0, 120, 3)]
+    expected = {algo: PEP.predict_batch(records, algorithm=algo, engine='sklearn')
+                for algo in PEP.ALGORITHMS}
+    path = PEP.export_compiled(str(tmp_path / 'compiled'))
+
+    script = (
+        'import json, sys, numpy as np, PEP\n'
+        f'PEP.load_compiled_models({path!r})\n'
+        'assert isinstance(PEP.compile_models()["random"].feature, np.memmap)\n'
+        f'records = {records!r}\n'
+        'out = {a: PEP.predict_batch(records, algorithm=a, engine="compiled")'
+        ' for a in PEP.ALGORITHMS}\n'
+        'assert "sklearn" not in sys.modules\n'
+        'print(json.dumps(out))\n'
+    )
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                            cwd=PEP._BASE_DIR, check=True)
+    assert json.loads(result.stdout) == expected
+
+
+def test_load_compiled_models_exports_the_default_version(tmp_path, monkeypatch):
+    build_models(verbose=False)
+    registry, original = PEP.REGISTRY, PEP.REGISTRY.active
+    monkeypatch.setattr(PEP, 'MODEL_DIR', str(tmp_path))
+    PEP.save_models(original.payload)
+    # e.g. a bundle from update_models is active when the arrays are first needed
+    other = PEP.ModelBundle('other-test', original.tree, original.tree, original.gnb,
+                            original.symptoms, original.disease)
+    registry.install(other)
+    try:
+        assert PEP.load_compiled_models() == original.version
+        with open(tmp_path / f'pep-{original.version}.compiled' / 'meta.json') as fh:
+            assert json.load(fh)['version'] == original.version
+    finally:
+        registry.install(original)
+        registry.remove(other.version)
+
+
+def test_predict_topk_ranks_probabilities_and_sparse_gnb_matches():
+    _, _, gnb, symptoms, _ = build_models(verbose=False)
+    X = PEP.load_training_data()['X_test']
+
+    compiled_gnb = PEP.compile_models()['gnb']
+    assert np.allclose(compiled_gnb.sparse_predict_proba(X), gnb.predict_proba(X), atol=1e-9)
+
+    for algo in PEP.ALGORITHMS:
+        top = PEP.predict_topk_batch(X, k=3, algorithm=algo)
+        assert [t[0][0] for t in top] == PEP.predict_batch(X, algorithm=algo, exact_match=False)
+        for ranked in top:
+            scores = [s for _, s in ranked]
+            assert len(ranked) == 3 and scores == sorted(scores, reverse=True)
+
+    top = PEP.predict_topk_batch(X, k=len(PEP.REGISTRY.active.disease), algorithm='auto')
+    assert [t[0][0] for t in top] == PEP.predict_batch(X, algorithm='auto', voting='soft',
+                                                       exact_match=False)
+    assert all(abs(sum(s for _, s in ranked) - 1.0) < 1e-9 for ranked in top)
+    assert PEP.predict_topk(symptoms[:3], k=2) == PEP.predict_topk_batch([symptoms[:3]], k=2)[0]
+
+
+def test_update_models_folds_in_new_cases_and_swaps_atomically():
+    build_models(verbose=False)
+    original = PEP.REGISTRY.active
+    data = PEP.load_training_data()
+    X = data['X_test']
+    labels = [original.disease[i] for i in data['y_test']]
+
+    stop = threading.Event()
+    errors = []
+
+    def predict_while_updating():
+        while not stop.is_set():
+            try:
+                PEP.predict_batch(X[:5], algorithm='auto')
+            except Exception as exc:  # pragma: no cover - reported below
+                errors.append(exc)
+
+    threads = [threading.Thread(target=predict_while_updating) for _ in range(4)]
+    for t in threads:
+        t.start()
+    try:
+        report = PEP.update_models(X, labels, n_new_trees=5).result(timeout=120)
+        stop.set()
+        for t in threads:
+            t.join()
+        assert not errors
+        assert report['rows'] == len(X)
+        updated = PEP.REGISTRY.active
+        assert updated.version == report['version'] != original.version
+        assert len(updated.forest.estimators_) == len(original.forest.estimators_) + 5
+        assert updated.gnb.class_count_.sum() == original.gnb.class_count_.sum() + len(X)
+        # X_test rows are training profiles, so bypass the exact-match index
+        assert PEP.predict_batch(X, algorithm='tree', exact_match=False) == labels
+        # the previous version stays registered for side-by-side scoring
+        assert PEP.predict_batch(X, version=original.version, exact_match=False) == \
+            PEP.predict_batch(X, algorithm='tree', version=original.version, exact_match=False)
+
+        with pytest.raises(ValueError, match='unknown disease'):
+            PEP.update_models([['itching']], ['Not a disease'])
+        with pytest.raises(ValueError, match='no records'):
+            PEP.update_models([], [])
+        # a later update only folds its own rows into GaussianNB
+        PEP.update_models([['itching', 'skin_rash']], ['Fungal infection']).result(timeout=120)
+        assert PEP.REGISTRY.active.gnb.class_count_.sum() == updated.gnb.class_count_.sum() + 1
+    finally:
+        stop.set()
+        PEP.REGISTRY.install(original)
+
+
+def test_model_registry_is_single_flight_and_hot_swaps_under_thread_pool(monkeypatch, tmp_path):
+    build_models(verbose=False)  # make sure the artifact exists
+    registry = PEP.ModelRegistry(max_inactive=1)
+    monkeypatch.setattr(PEP, 'REGISTRY', registry)
+    loads = []
+    load_or_train = PEP._load_or_train
+
+    def slow_load(*args, **kwargs):
+        loads.append(args)
+        time.sleep(0.05)
+        return load_or_train(*args, **kwargs)
+
+    monkeypatch.setattr(PEP, '_load_or_train', slow_load)
+    # random sparse profiles, on which the tree and the forest disagree
+    rng = np.random.default_rng(0)
+    X = (rng.random((200, len(PEP.symptoms))) < 0.04).astype(np.uint8)
+
+    # cold process: many threads at once, one load
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        cold = list(pool.map(lambda _: PEP.predict_batch(X, algorithm='auto'), range(32)))
+    assert len(loads) == 1
+    assert all(result == cold[0] for result in cold)
+
+    a = registry.active
+    # a second version whose "forest" is the decision tree, to tell them apart
+    b = PEP.ModelBundle('b-test', a.tree, a.tree, a.gnb, a.symptoms, a.disease)
+    registry.install(b, activate=False)
+    expected = {
+        a.version: PEP.predict_batch(X, algorithm='random', version=a.version),
+        b.version: PEP.predict_batch(X, algorithm='tree', version=a.version),
+    }
+    assert expected[a.version] != expected[b.version]
+
+    def work(i):
+        if i % 7 == 0:
+            registry.activate(b.version if i % 2 else a.version)
+        version = (a.version, b.version)[i % 2]
+        assert PEP.predict_batch(X, algorithm='random', version=version) == expected[version]
+        assert PEP.predict_batch(X, algorithm='random') in expected.values()
+        return PEP.predict_symptoms(['itching', 'skin_rash'], algorithm='random')
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert all(isinstance(r, str) for r in pool.map(work, range(120)))
+    assert len(loads) == 1
+
+    registry.activate(a.version)
+    registry.install(PEP.ModelBundle('c-test', a.tree, a.forest, a.gnb, a.symptoms, a.disease),
+                     activate=False)
+    assert registry.versions() == [a.version, 'c-test']  # oldest inactive dropped
+    with pytest.raises(ValueError):
+        registry.remove(a.version)
+    with pytest.raises(KeyError):
+        PEP.predict_batch(X, version='b-test')
+
+    # compiled-only process: the first sklearn predictions load the artifact once
+    PEP.export_compiled(str(tmp_path / 'compiled'))
+    registry = PEP.ModelRegistry()
+    monkeypatch.setattr(PEP, 'REGISTRY', registry)
+    PEP.load_compiled_models(str(tmp_path / 'compiled'))
+    assert not registry.active.has_estimators
+    loads.clear()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: PEP.predict_batch(X, algorithm='auto', engine='sklearn'),
+                                range(16)))
+    assert len(loads) == 1 and registry.active.has_estimators
+    assert all(result == cold[0] for result in results)
+
+
+def test_instrumentation_stats_and_prometheus(tmp_path):
+    PEP.build_models(verbose=False)
+    PEP.enable_instrumentation()
+    try:
+        PEP.predict_symptoms(['itching', 'skin_rash'], algorithm='auto', use_cache=False)
+        PEP.predict_batch([['itching'], ['acidity', 'vomiting']], algorithm='tree')
+        stats = PEP.get_stats()
+        assert stats['enabled']
+        assert {'encode', 'vote', 'model.tree', 'model.random', 'model.gnb',
+                'total.predict_symptoms', 'total.predict_batch'} <= set(stats['stages'])
+        assert stats['counters']['calls.predict_batch'] == 1
+        assert stats['counters']['rows.tree'] == 3
+        total = stats['stages']['total.predict_symptoms']
+        assert total['count'] == 1 and 0 < total['p50_s'] <= total['max_s']
+
+        text = open(PEP.write_prometheus(str(tmp_path / 'pep.prom'))).read()
+        assert 'pep_stage_seconds{stage="model.tree",quantile="0.99"}' in text
+        assert 'pep_rows_total{algorithm="tree"} 3' in text
+    finally:
+        PEP.enable_instrumentation(False)
+    assert PEP.get_stats()['stages'] == {}
+
+    hist = PEP.LatencyHistogram()
+    values = np.random.default_rng(0).integers(1, 10**9, size=5000)
+    for v in values:
+        hist.record(int(v))
+    for q in (0.5, 0.9, 0.99):
+        exact = np.quantile(values, q, method='inverted_cdf')
+        assert abs(hist.quantile(q) - exact) <= exact / 8
+
+
+def test_evaluate_models_grouped_cv():
+    data = PEP.load_training_data()
+    X, y = data['X_train'], data['y_train']
+    splits = PEP._cv_splits(X, y, folds=3, random_state=0)
+    profiles = np.unique(X, axis=0, return_inverse=True)[1].reshape(-1)
+    for train_idx, val_idx in splits:
+        assert not set(profiles[train_idx]) & set(profiles[val_idx])
+
+    grid = {'tree': {'max_depth': [None, 4]}, 'gnb': {}}
+    rows = PEP.evaluate_models(grid, folds=3, n_jobs=1, latency_rows=3)
+    assert [(r['family'], r['params']) for r in rows] == [
+        ('gnb', {}), ('tree', {'max_depth': None}), ('tree', {'max_depth': 4})]
+    assert all(r['fit_seconds'] > 0 and r['latency_s'] > 0 and r['size_bytes'] > 0 for r in rows)
+    fastest = min(rows[:2], key=lambda r: r['latency_s'])
+    table = PEP.format_evaluation(rows, min_accuracy=0.5)
+    assert 'max_depth=4' in table
+    assert table.endswith(f"{fastest['family']} ({PEP._format_params(fastest['params'])})")
+
+
+def test_compact_models(tmp_path, monkeypatch):
+    full = PEP.REGISTRY.get()
+    bundle = PEP.compact_models()
+    report = bundle.payload['compaction']
+    assert report['dropped']['constant'] == ['fluid_overload']
+    assert report['merged_into']['runny_nose'] == 'throat_irritation'
+    assert bundle.n_features == len(full.symptoms) - 12
+    assert report['trees']['after'] < report['trees']['before']
+    assert all(report['compiled_bytes']['after'][a] <= report['compiled_bytes']['before'][a]
+               for a in PEP.ALGORITHMS)
+    # min_trees=0 means no minimum, like 1; negative values are rejected
+    smallest = PEP.compact_models(min_trees=0).payload['compaction']['trees']['after']
+    assert smallest == PEP.compact_models(min_trees=1).payload['compaction']['trees']['after']
+    assert smallest < report['trees']['before']
+    with pytest.raises(ValueError, match='min_trees'):
+        PEP.compact_models(min_trees=-1)
+
+    data = PEP.load_training_data()
+    expected = [full.disease[i] for i in data['y_test']]
+    X = np.random.default_rng(0).integers(0, 2, size=(300, len(full.symptoms)), dtype=np.uint8)
+    registry = PEP.REGISTRY
+    registry.install(bundle, activate=False)
+    try:
+        for algo in PEP.ALGORITHMS + ('auto',):
+            for engine in PEP.ENGINES:
+                assert PEP.predict_batch(data['X_test'], algorithm=algo, engine=engine,
+                                         version=bundle.version) == expected
+            assert (PEP.predict_batch(X, algorithm=algo, version=bundle.version)
+                    == PEP.predict_batch(X, algorithm=algo, engine='compiled',
+                                         version=bundle.version))
+        for dtype in (np.float32, np.float64):
+            assert (PEP.predict_batch(X.astype(dtype), algorithm='auto', version=bundle.version)
+                    == PEP.predict_batch(X, algorithm='auto', version=bundle.version))
+        projected = bundle.project(X)
+        assert np.array_equal(bundle.compiled()['random'].predict_proba(projected),
+                              bundle.forest.predict_proba(projected))
+        # merged and dropped symptoms are accepted and encode like their kept twin
+        assert (PEP.predict_symptoms(['runny_nose', 'fluid_overload', 'chills'],
+                                     version=bundle.version, use_cache=False)
+                == PEP.predict_symptoms(['throat_irritation', 'chills'],
+                                        version=bundle.version, use_cache=False))
+        assert PEP.predict_batch([['runny_nose', 'chills']], version=bundle.version) == \
+            PEP.predict_batch([['throat_irritation', 'chills']], version=bundle.version)
+        with pytest.raises(PEP.UnknownSymptomError):
+            PEP.predict_batch([['not_a_symptom']], version=bundle.version)
+
+        # saved compacted models are what a worker pinned to their version serves
+        monkeypatch.setattr(PEP, 'MODEL_DIR', str(tmp_path))
+        PEP.save_models(bundle.payload)
+        registry.activate(bundle.version)
+        PEP.export_compiled()
+        registry.activate(full.version)
+        monkeypatch.setattr(PEP, 'MODEL_VERSION', bundle.version)
+        for load in (PEP.build_models, PEP.load_compiled_models):
+            monkeypatch.setattr(PEP, 'REGISTRY', PEP.ModelRegistry())
+            load()
+            assert PEP.REGISTRY.active.version == bundle.version
+            assert PEP.REGISTRY.active.n_features == bundle.n_features
+            assert PEP.predict_batch(data['X_test']) == expected
+    finally:
+        registry.activate(full.version)
+        registry.remove(bundle.version)
+
+
+def test_suggest_symptoms():
+    bundle = PEP.REGISTRY.get()
+    assert 'cooccurrence' in bundle.payload
+    data = PEP.load_training_data()
+    X, y = np.asarray(data['X_train']), data['y_train']
+
+    everything = PEP.suggest_symptoms([])
+    assert everything['exact'] and sorted(everything['diseases']) == sorted(bundle.disease)
+
+    selected = ['itching', 'skin_rash']
+    hints = PEP.suggest_symptoms(selected, k=4)
+    cols = [bundle.symptom_index[s] for s in selected]
+    rows = X[:, cols].all(axis=1)
+    assert hints['exact']
+    assert sorted(hints['diseases']) == sorted({bundle.disease[i] for i in y[rows]})
+    names = [s for s, _ in hints['next']]
+    scores = [score for _, score in hints['next']]
+    assert len(names) == 4 and not set(names) & set(selected)
+    assert scores == sorted(scores, reverse=True) and scores[0] > 0
+    assert all(X[rows][:, bundle.symptom_index[s]].any() for s in names)
+
+    # a combination never seen in training falls back to co-occurrence
+    assert not PEP.suggest_symptoms(['itching', 'acidity', 'coma'])['exact']
+    with pytest.raises(PEP.UnknownSymptomError):
+        PEP.suggest_symptoms(['not_a_symptom'])
+
+
+def test_exact_match_lookup():
+    bundle = PEP.REGISTRY.get()
+    assert 'exact_match' in bundle.payload
+    data = PEP.load_training_data()
+    X, y = np.asarray(data['X_train']), data['y_train']
+    names = [bundle.symptoms[c] for c in np.flatnonzero(X[0])]
+    unseen = ['itching', 'acidity', 'coma']
+    assert bundle.exact_match().lookup(np.asarray([PEP.encode_symptoms(unseen)]))[0] == -1
+
+    metrics = PEP.enable_instrumentation(True)
+    try:
+        # a training profile is answered without running a model
+        assert PEP.predict_symptoms(names, algorithm='gnb', use_cache=False) == bundle.disease[y[0]]
+        assert metrics.counters.get('rows.exact') == 1 and 'rows.gnb' not in metrics.counters
+        PEP.predict_symptoms(names, algorithm='gnb', use_cache=False, exact_match=False)
+        assert metrics.counters.get('rows.gnb') == 1
+    finally:
+        PEP.enable_instrumentation(False)
+
+    # hits and misses in one batch match the models run row by row
+    rng = np.random.default_rng(0)
+    mixed = np.vstack([X[:50], (rng.random((50, X.shape[1])) < 0.05).astype(np.uint8)])
+    rng.shuffle(mixed)
+    for algo in PEP.ALGORITHMS + ('auto',):
+        expected = PEP.predict_batch(mixed, algorithm=algo, exact_match=False)
+        assert PEP.predict_batch(mixed, algorithm=algo) == expected
+        assert PEP.predict_batch(X[:5], algorithm=algo) == [bundle.disease[i] for i in y[:5]]
+    winners, votes = PEP.predict_batch(X[:5], algorithm='auto', return_votes=True)
+    assert set(votes) == set(PEP.ALGORITHMS)
+    # float 0/1 matrices are looked up like integer ones
+    for dtype in (np.float64, np.float32):
+        assert PEP.predict_batch(mixed.astype(dtype), algorithm='auto') == \
+            PEP.predict_batch(mixed, algorithm='auto')
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+from PEP import predict_batch
+import serve
+
+
+async def _request(port, method, path, payload=None, content_length=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode() if payload is not None else b''
+    length = len(body) if content_length is None else content_length
+    writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {length}\r\n'
+                 'Connection: close\r\n\r\n'.encode() + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    head, _, body = raw.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def test_server_micro_batches_concurrent_requests():
+    records = [['stomach_pain', 'acidity', 'vomiting'], ['itching', 'skin_rash'],
+               ['cough', 'high_fever', 'breathlessness']] * 10
+
+    async def scenario():
+        server, app = await serve.start_server(port=0, window=0.05, max_rows=1000, wait_ready=True)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            assert await _request(port, 'GET', '/readyz') == (200, {'status': 'ready'})
+            responses = await asyncio.gather(*(
+                _request(port, 'POST', '/predict', {'symptoms': r, 'algorithm': 'auto'})
+                for r in records))
+            batch = await _request(port, 'POST', '/predict', {'records': records[:3]})
+            bad = await _request(port, 'POST', '/predict', {'symptoms': ['not_a_symptom']})
+            missing = await _request(port, 'GET', '/nope')
+            for length in ('-5', 'abc'):
+                assert await _request(port, 'POST', '/predict', content_length=length) == (
+                    400, {'error': 'invalid Content-Length'})
+            return responses, batch, bad, missing, app.batcher.stats()
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    responses, batch, bad, missing, stats = asyncio.run(scenario())
+    assert [r[1]['prediction'] for r in responses] == predict_batch(records, algorithm='auto')
+    assert batch == (200, {'predictions': predict_batch(records[:3])})
+    assert bad[0] == 400 and 'not_a_symptom' in bad[1]['error']
+    assert missing[0] == 404
+    # the 30 concurrent requests share far fewer model calls
+    assert stats['requests'] == 31 and stats['batches'] < 10
@@ -1,12 +1,11 @@
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, messagebox
 from tkinter.scrolledtext import ScrolledText
 
 # Import prediction function from PEP.py
-from PEP import predict_symptoms, build_models
-
-# Build models in background to reduce UI lag on first prediction
-build_models(verbose=False)
+from PEP import predict_symptoms, build_models, suggest_symptoms
 
 # Simple knowledge base: brief notes and precautions for common diseases
 # Keys are normalized disease names (lowercase, alphanumeric only)
@@ -144,17 +143,84 @@ def _norm_key(name: str):
     return ''.join(ch for ch in str(name).lower() if ch.isalnum())
 
 class SymptomSelector(tk.Tk):
+    # how often (ms) the Tk loop checks on work running in the background
+    POLL_MS = 20
+
     def __init__(self):
         super().__init__()
+        self._started = time.perf_counter()
+        # seconds until the window was idle, the models were loaded and the
+        # last prediction returned; also shown in the status line
+        self.timings = {}
         self.title('Peptic Ulcer / Disease Predictor')
         self.geometry('1200x800')
         self.configure(bg='#f7fbff')
 
-        # fetch symptom list from PEP module by calling build_models (cached)
-        _, _, _, symptoms, _ = build_models()
-        self.symptoms = symptoms
+        self.symptoms = []
+        self.vars = []
+        # Loading and predicting run on one worker thread, in submission order;
+        # widgets are only touched from the Tk loop, which polls the results.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pep-ui')
+        # future -> id of its scheduled poll, cancelled when the window closes
+        self._polls = {}
+        self.protocol('WM_DELETE_WINDOW', self._on_close)
 
         self.create_widgets()
+        self._idle_id = self.after_idle(self._on_window_ready)
+        self._submit(self._load_models, self._on_models_loaded)
+
+    def _submit(self, fn, callback, *args):
+        """Run ``fn(*args)`` in the background and ``callback(future)`` on the Tk loop."""
+        future = self._executor.submit(fn, *args)
+        self._polls[future] = self.after(self.POLL_MS, self._poll, future, callback)
+
+    def _poll(self, future, callback):
+        if future.done():
+            del self._polls[future]
+            callback(future)
+        else:
+            self._polls[future] = self.after(self.POLL_MS, self._poll, future, callback)
+
+    def _on_close(self):
+        # no callbacks may run on destroyed widgets; queued work is dropped
+        # (shutdown(cancel_futures=True) would need Python 3.9)
+        self.after_cancel(self._idle_id)
+        for future, poll_id in self._polls.items():
+            self.after_cancel(poll_id)
+            future.cancel()
+        self._polls.clear()
+        self._executor.shutdown(wait=False)
+        self.destroy()
+
+    def _on_window_ready(self):
+        self.timings['window'] = time.perf_counter() - self._started
+        self._show_status()
+
+    def _show_status(self, extra=None):
+        parts = [f'{name} {seconds * 1e3:.0f} ms' if seconds < 1 else f'{name} {seconds:.2f} s'
+                 for name, seconds in self.timings.items()]
+        if extra:
+            parts.insert(0, extra)
+        self.status_var.set(' | '.join(parts))
+
+    @staticmethod
+    def _load_models():
+        # loads the exported artifact, or trains on first use
+        _, _, _, symptoms, _ = build_models()
+        return symptoms
+
+    def _on_models_loaded(self, future):
+        try:
+            symptoms = future.result()
+        except Exception as exc:
+            self._show_status('Loading models failed')
+            messagebox.showerror('Loading models failed', str(exc))
+            return
+        self.timings['models'] = time.perf_counter() - self._started
+        self.populate_symptoms(symptoms)
+        self.update_hints()
+        self.predict_btn.state(['!disabled'])
+        self._show_status()
 
     def create_widgets(self):
         # colored top banner with a simple drawn emblem
@@ -186,24 +252,13 @@ class SymptomSelector(tk.Tk):
 
         inner = ttk.Frame(canvas, relief='flat')
         canvas.create_window((0,0), window=inner, anchor='nw')
+        self.symptom_frame = inner
 
-        self.vars = []
-        # use a four-column layout for checkbuttons to show all symptoms
-        col = 0
-        row = 0
-        for idx, s in enumerate(self.symptoms):
-            v = tk.IntVar(value=0)
-            chk = ttk.Checkbutton(inner, text=s.replace('_',' '), variable=v)
-            chk.grid(row=row, column=col, sticky='w', padx=6, pady=2)
-            self.vars.append((s, v))
-            row += 1
-            if row >= 35:  # 35 rows per column to fit all symptoms
-                row = 0
-                col += 1
-        
-        # Update scroll region after all widgets are added
-        inner.update_idletasks()
-        canvas.configure(scrollregion=canvas.bbox('all'))
+        # Track the scroll region as the frame is laid out, instead of forcing
+        # a synchronous layout pass once the checkbuttons are added
+        inner.bind('<Configure>', lambda event: canvas.configure(scrollregion=canvas.bbox('all')))
+        self._loading_lbl = ttk.Label(inner, text='Loading models...')
+        self._loading_lbl.grid(row=0, column=0, sticky='w', padx=6, pady=2)
         
         # Enable mousewheel scrolling
         def _on_mousewheel(event):
@@ -222,14 +277,20 @@ class SymptomSelector(tk.Tk):
         alg_combo = ttk.Combobox(alg_frm, textvariable=self.alg_var, values=['auto (recommended)','tree','random','gnb'], state='readonly')
         alg_combo.pack(side='left', padx=5)
 
-        # Predict button
-        btn = ttk.Button(right_area, text='Predict', command=self.on_predict)
-        btn.pack(pady=12, fill='x', padx=8)
+        # Predict button, enabled once the models are loaded
+        self.predict_btn = ttk.Button(right_area, text='Predict', command=self.on_predict)
+        self.predict_btn.state(['disabled'])
+        self.predict_btn.pack(pady=12, fill='x', padx=8)
 
         # Help text
         help_lbl = ttk.Label(right_area, wraplength=420, text='Tip: Use Auto recommended for best result. Select symptoms and click Predict.')
         help_lbl.pack(padx=8, pady=(6,12))
 
+        # next-symptom hints, updated as symptoms are ticked
+        self.hint_var = tk.StringVar(value='')
+        ttk.Label(right_area, textvariable=self.hint_var, wraplength=420).pack(
+            anchor='w', padx=8, pady=(0, 6))
+
         # Result area (styled) - text only
         res_frame = ttk.LabelFrame(right_area, text='Result')
         res_frame.pack(fill='both', padx=8, pady=6, expand=True)
@@ -238,31 +299,76 @@ class SymptomSelector(tk.Tk):
         self.result_txt = ScrolledText(res_frame, height=12, width=50, wrap='word')
         self.result_txt.pack(side='top', fill='both', expand=True, padx=6, pady=6)
 
+        self.status_var = tk.StringVar(value='Loading models...')
+        ttk.Label(right_area, textvariable=self.status_var, wraplength=420).pack(
+            anchor='w', padx=8, pady=(0, 6))
+
+    def populate_symptoms(self, symptoms):
+        """Add one checkbutton per symptom to the (scrollable) symptom area."""
+        self._loading_lbl.destroy()
+        self.symptoms = symptoms
+        self.vars = []
+        # use a four-column layout for checkbuttons to show all symptoms
+        col = 0
+        row = 0
+        for idx, s in enumerate(self.symptoms):
+            v = tk.IntVar(value=0)
+            chk = ttk.Checkbutton(self.symptom_frame, text=s.replace('_',' '), variable=v,
+                                  command=self.update_hints)
+            chk.grid(row=row, column=col, sticky='w', padx=6, pady=2)
+            self.vars.append((s, v))
+            row += 1
+            if row >= 35:  # 35 rows per column to fit all symptoms
+                row = 0
+                col += 1
+
+    def update_hints(self):
+        """Show the most informative next symptoms and the diseases still possible."""
+        # a lookup in the precomputed co-occurrence index: fast enough for the Tk thread
+        selected = [s for s, v in self.vars if v.get()==1]
+        hints = suggest_symptoms(selected, k=5)
+        lines = []
+        if hints['next']:
+            lines.append('Also check: ' + ', '.join(s.replace('_', ' ') for s, _ in hints['next']))
+        if selected:
+            prefix = 'Consistent with' if hints['exact'] else 'Closest matches'
+            lines.append(f'{prefix}: ' + ', '.join(hints['diseases'][:6]))
+        self.hint_var.set('\n'.join(lines))
+
     def on_predict(self):
         selected = [s for s, v in self.vars if v.get()==1]
         if not selected:
             messagebox.showinfo('No symptoms', 'Please select at least one symptom')
             return
-        alg = self.alg_var.get()
+        self.predict_btn.state(['disabled'])
+        self._show_status('Predicting...')
+        self._submit(self._predict, self._on_prediction, selected, self.alg_var.get())
+
+    @staticmethod
+    def _predict(selected, alg):
+        start = time.perf_counter()
+        votes = None
         # map friendly 'auto (recommended)' to ensemble voting
         if alg.lower().startswith('auto'):
-            # query each algorithm and perform majority vote
-            p1 = predict_symptoms(selected, algorithm='tree')
-            p2 = predict_symptoms(selected, algorithm='random')
-            p3 = predict_symptoms(selected, algorithm='gnb')
-            votes = [p for p in (p1,p2,p3) if p]
-            if not votes:
-                pred = None
-            else:
-                # majority vote
-                from collections import Counter
-                cnt = Counter(votes)
-                pred, cntv = cnt.most_common(1)[0]
-                # If tie (e.g. three different), fall back to tree's prediction
-                if cntv == 1 and len(set(votes)) > 1:
-                    pred = p1
+            # one encoding and one call per model, combined by majority vote
+            pred, votes = predict_symptoms(selected, algorithm='auto', return_votes=True)
         else:
             pred = predict_symptoms(selected, algorithm=alg)
+        return pred, votes, time.perf_counter() - start
+
+    def _on_prediction(self, future):
+        self.predict_btn.state(['!disabled'])
+        try:
+            pred, votes, seconds = future.result()
+        except Exception as exc:
+            self._show_status()
+            messagebox.showerror('Prediction failed', str(exc))
+            return
+        self.timings['predict'] = seconds
+        self._show_status()
+        self.show_result(pred, votes)
+
+    def show_result(self, pred, votes=None):
         if pred:
             # display text only with brief note and precautions
             ulcer_type = self._detect_ulcer_type(pred)
@@ -282,6 +388,8 @@ class SymptomSelector(tk.Tk):
             lines.append(f'Predicted disease: {title}')
             if ulcer_type:
                 lines.append(f'Ulcer type: {ulcer_type}')
+            if votes:
+                lines.append('Model votes: ' + ', '.join(f'{a}: {v}' for a, v in votes.items()))
             lines.append('')
             lines.append('About:')
             lines.append(f'  - {note}')